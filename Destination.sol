@@ -23,9 +23,20 @@ contract Destination is AccessControl {
     }
 
     function wrap(address _underlying_token, address _recipient, uint256 _amount) public onlyRole(WARDEN_ROLE) { 
+        _wrap(_underlying_token, _recipient, _amount);
+    }
+
+    function wrapBatch(address[] calldata _underlying_tokens, address[] calldata _recipients, uint256[] calldata _amounts) public onlyRole(WARDEN_ROLE) {
+        require(_underlying_tokens.length == _recipients.length && _recipients.length == _amounts.length, "Array lengths do not match");
+        for (uint256 i = 0; i < _amounts.length; i++) {
+            _wrap(_underlying_tokens[i], _recipients[i], _amounts[i]);
+        }
+    }
+
+    function _wrap(address _underlying_token, address _recipient, uint256 _amount) internal { 
         address wrapped = wrapped_tokens[_underlying_token]; 
         require(wrapped != address(0), "Wrapped token does not exist"); 
-				BridgeToken(wrapped).mint(_recipient, _amount); 
+        BridgeToken(wrapped).mint(_recipient, _amount); 
         emit Wrap(_underlying_token, wrapped, _recipient, _amount); 
     }
 
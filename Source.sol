@@ -30,6 +30,17 @@ contract Source is AccessControl {
 	}
 
 	function withdraw(address _token, address _recipient, uint256 _amount ) onlyRole(WARDEN_ROLE) public {
+		_withdraw(_token, _recipient, _amount);
+	}
+
+	function withdrawBatch(address[] calldata _tokens, address[] calldata _recipients, uint256[] calldata _amounts ) onlyRole(WARDEN_ROLE) public {
+		require(_tokens.length == _recipients.length && _recipients.length == _amounts.length, "Array lengths do not match");
+		for (uint256 i = 0; i < _amounts.length; i++) {
+			_withdraw(_tokens[i], _recipients[i], _amounts[i]);
+		}
+	}
+
+	function _withdraw(address _token, address _recipient, uint256 _amount ) internal {
 		require(_amount > 0, "Amount must be greater than 0");
     require(_recipient != address(0), "Invalid recipient address");
     ERC20(_token).transfer(_recipient, _amount);
@@ -0,0 +1,334 @@
+#!/bin/python
+"""
+    Network-free benchmarks for the mining, Merkle tree and signing hot paths.
+
+    python benchmark.py                 run everything and compare with the baseline
+    python benchmark.py --save          run and record the results as the new baseline
+    python benchmark.py --quick         smaller input sizes, for a fast sanity check
+    python benchmark.py --only merkle   run the benchmarks whose name contains "merkle"
+
+    Inputs come from fixed seeds, so runs on the same machine are comparable.
+    Each benchmark records its best time over a few repeats, its throughput and its
+    peak traced memory; a throughput drop or memory growth beyond --tolerance against
+    the baseline is reported as a regression (and the exit status is 1), as is
+    missing one of the absolute TARGETS
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+SEED = 5830
+BASELINE = Path(__file__).parent.absolute() / "benchmark_baseline.json"
+TOLERANCE = 0.2  # allowed fractional throughput drop / memory growth before a regression is flagged
+MIN_MEMORY_DELTA = 1 << 20  # ignore memory growth smaller than this many bytes
+
+# Absolute floors checked on every run, baseline or not: name -> (minimum ops/s, maximum peak bytes).
+# The sieve targets leave about 2x headroom over a single core of a 2020s laptop
+TARGETS = {
+    f"first_primes[n={1 << 20}]": (1000000, 64 << 20),
+    f"prime_leaves[n={1 << 20}]": (1000000, 48 << 20),
+}
+
+MINING_DIFFICULTIES = (8, 12, 16, 20)
+PARALLEL_MINING_DIFFICULTIES = (16, 20)
+MERKLE_SIZES = (8192, 1 << 20)
+PRIME_COUNTS = (8192, 1 << 20)
+PROOFS = 1000
+SIGNATURES = 10000
+BULK_SIGNATURES = 2000
+
+QUICK_MINING_DIFFICULTIES = (8, 12, 16)
+QUICK_PARALLEL_MINING_DIFFICULTIES = (16,)
+QUICK_MERKLE_SIZES = (8192,)
+QUICK_PRIME_COUNTS = (8192,)
+QUICK_SIGNATURES = 200
+QUICK_BULK_SIGNATURES = 200
+
+BENCHMARKS = []  # (name, repeats, factory)
+
+
+def _mining(difficulty):
+    from findBlockNonce import mine_block
+
+    rng = random.Random(SEED + difficulty)
+    prev_hash = rng.randbytes(32)
+    transactions = [''.join(rng.choice('abcdef0123456789') for _ in range(64)) for _ in range(10)]
+
+    def run():
+        # Nonces are tried from 0, so the nonce found is also the number of hashes before it
+        return int(mine_block(difficulty, prev_hash, transactions)) + 1
+    return run, None
+
+
+def _parallel_mining(difficulty):
+    from findBlockNonce import mine_block_parallel
+
+    # Same inputs as _mining, so the two rates compare directly
+    rng = random.Random(SEED + difficulty)
+    prev_hash = rng.randbytes(32)
+    transactions = [''.join(rng.choice('abcdef0123456789') for _ in range(64)) for _ in range(10)]
+
+    def run():
+        # Counts every hash the workers computed, including those past the nonce found
+        _, hashes = mine_block_parallel(difficulty, prev_hash, transactions)
+        return hashes
+    return run, None
+
+
+def _merkle_leaves(n):
+    rng = random.Random(SEED + n)
+    return [rng.randbytes(32) for _ in range(n)]
+
+
+def _build_merkle(n):
+    from submitProof import build_merkle
+
+    leaves = _merkle_leaves(n)
+    return (lambda: build_merkle(leaves)), n
+
+
+def _prove_merkle(n):
+    from submitProof import build_merkle, prove_merkle
+
+    tree = build_merkle(_merkle_leaves(n))
+    rng = random.Random(SEED)
+    indices = [rng.randrange(n) for _ in range(PROOFS)]
+
+    def run():
+        for i in indices:
+            prove_merkle(tree, i)
+    return run, PROOFS
+
+
+def _prove_merkle_many(n):
+    from merkle import build_merkle, prove_merkle_many
+
+    tree = build_merkle(_merkle_leaves(n))
+    rng = random.Random(SEED)
+    indices = [rng.randrange(n) for _ in range(PROOFS)]
+    return (lambda: prove_merkle_many(tree, indices)), PROOFS
+
+
+def _merkle_updates(n):
+    from merkle import IncrementalMerkleTree
+
+    tree = IncrementalMerkleTree(_merkle_leaves(n))
+    rng = random.Random(SEED)
+    changes = [(rng.randrange(n), rng.randbytes(32)) for _ in range(PROOFS)]
+
+    def run():
+        for i, leaf in changes:
+            tree.update(i, leaf)
+    return run, PROOFS
+
+
+def _generate_primes(n):
+    from submitProof import generate_primes
+    return (lambda: generate_primes(n)), n
+
+
+def _first_primes(n):
+    from sieve import first_primes
+    return (lambda: first_primes(n)), n
+
+
+def _prime_leaves(n):
+    from sieve import prime_leaves
+    return (lambda: prime_leaves(n)), n
+
+
+def _signing(count):
+    from signatures import sign, verify
+
+    rng = random.Random(SEED)
+    messages = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(20)) for _ in range(count)]
+
+    def run():
+        # sign() prints every account it creates
+        with contextlib.redirect_stdout(io.StringIO()):
+            for m in messages:
+                public_key, signed = sign(m)
+                verify(m, public_key, signed)
+    return run, count
+
+
+def _verify_many(count):
+    from eth_account import Account
+    from eth_account.messages import encode_defunct
+    from signatures import verify_many
+
+    rng = random.Random(SEED)
+    accounts = [Account.from_key(rng.randbytes(32)) for _ in range(10)]
+    triples = []
+    for i in range(count):
+        account = accounts[i % len(accounts)]
+        challenge = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(32))
+        triples.append((challenge, account.address, Account.sign_message(encode_defunct(text=challenge), account.key)))
+    # Without the cache, so every run does the full recovery work
+    return (lambda: verify_many(triples, cache=False)), count
+
+
+def register_benchmarks(quick=False):
+    """
+        Registers the benchmarks at full or --quick sizes. Each factory prepares its
+        inputs and returns (run, ops): run() is the code being measured and ops the
+        number of operations (hashes, leaves, proofs, ...) it performs, or None if
+        run() returns that number itself
+    """
+    for difficulty in (QUICK_MINING_DIFFICULTIES if quick else MINING_DIFFICULTIES):
+        BENCHMARKS.append((f"mine_block[k={difficulty}]", 1 if difficulty >= 20 else 3,
+                           lambda difficulty=difficulty: _mining(difficulty)))
+    for difficulty in (QUICK_PARALLEL_MINING_DIFFICULTIES if quick else PARALLEL_MINING_DIFFICULTIES):
+        BENCHMARKS.append((f"mine_block_parallel[k={difficulty}]", 1 if difficulty >= 20 else 3,
+                           lambda difficulty=difficulty: _parallel_mining(difficulty)))
+    for n in (QUICK_PRIME_COUNTS if quick else PRIME_COUNTS):
+        repeats = 1 if n > 100000 else 3
+        BENCHMARKS.append((f"generate_primes[n={n}]", repeats, lambda n=n: _generate_primes(n)))
+        BENCHMARKS.append((f"first_primes[n={n}]", repeats, lambda n=n: _first_primes(n)))
+        BENCHMARKS.append((f"prime_leaves[n={n}]", repeats, lambda n=n: _prime_leaves(n)))
+    for n in (QUICK_MERKLE_SIZES if quick else MERKLE_SIZES):
+        BENCHMARKS.append((f"build_merkle[leaves={n}]", 1 if n > 100000 else 3, lambda n=n: _build_merkle(n)))
+        BENCHMARKS.append((f"prove_merkle[leaves={n}]", 3, lambda n=n: _prove_merkle(n)))
+        BENCHMARKS.append((f"prove_merkle_many[leaves={n}]", 3, lambda n=n: _prove_merkle_many(n)))
+        BENCHMARKS.append((f"merkle_update[leaves={n}]", 3, lambda n=n: _merkle_updates(n)))
+    count = QUICK_SIGNATURES if quick else SIGNATURES
+    BENCHMARKS.append((f"sign_verify[n={count}]", 1, lambda: _signing(count)))
+    bulk = QUICK_BULK_SIGNATURES if quick else BULK_SIGNATURES
+    BENCHMARKS.append((f"verify_many[n={bulk}]", 1, lambda: _verify_many(bulk)))
+
+
+def measure(repeats, factory, memory=True):
+    """Returns the timing and memory record for one benchmark"""
+    run, ops = factory()
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        counted = run()
+        best = min(best, time.perf_counter() - start)
+    if ops is None:
+        ops = counted
+
+    result = {
+        'seconds': best,
+        'ops': ops,
+        'ops_per_second': ops / best if best > 0 else float('inf'),
+    }
+    if memory:
+        # Traced separately: tracemalloc slows allocation-heavy code down considerably
+        tracemalloc.start()
+        try:
+            run()
+            result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Returns a list of messages for results that regressed against baseline"""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None or 'ops_per_second' not in result or 'ops_per_second' not in before:
+            continue
+        if result['ops_per_second'] < before['ops_per_second'] * (1 - tolerance):
+            regressions.append(
+                f"{name}: {result['ops_per_second']:,.0f} ops/s, baseline {before['ops_per_second']:,.0f} ops/s"
+            )
+        if 'peak_bytes' in result and 'peak_bytes' in before:
+            growth = result['peak_bytes'] - before['peak_bytes']
+            if growth > MIN_MEMORY_DELTA and result['peak_bytes'] > before['peak_bytes'] * (1 + tolerance):
+                regressions.append(
+                    f"{name}: peak memory {result['peak_bytes'] / 2**20:.1f} MiB, baseline {before['peak_bytes'] / 2**20:.1f} MiB"
+                )
+    return regressions
+
+
+def check_targets(results, targets=TARGETS):
+    """Returns a list of messages for results that miss their absolute throughput or memory target"""
+    misses = []
+    for name, (min_ops, max_peak) in targets.items():
+        result = results.get(name)
+        if result is None or 'ops_per_second' not in result:
+            continue
+        if result['ops_per_second'] < min_ops:
+            misses.append(f"{name}: {result['ops_per_second']:,.0f} ops/s, target {min_ops:,.0f} ops/s")
+        if 'peak_bytes' in result and result['peak_bytes'] > max_peak:
+            misses.append(
+                f"{name}: peak memory {result['peak_bytes'] / 2**20:.1f} MiB, target {max_peak / 2**20:.1f} MiB"
+            )
+    return misses
+
+
+def run_benchmarks(only=None, memory=True):
+    """Runs the registered benchmarks (those whose name contains only, if given) and returns their results"""
+    results = {}
+    for name, repeats, factory in BENCHMARKS:
+        if only and only not in name:
+            continue
+        try:
+            result = measure(repeats, factory, memory)
+        except ImportError as e:
+            print(f"{name:32} skipped ({e})")
+            results[name] = {'skipped': str(e)}
+            continue
+        results[name] = result
+        peak = f"{result['peak_bytes'] / 2**20:8.1f} MiB" if 'peak_bytes' in result else ''
+        print(f"{name:32} {result['seconds']:9.3f}s {result['ops_per_second']:14,.0f} ops/s {peak}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the mining, Merkle and signing code")
+    parser.add_argument('--baseline', default=str(BASELINE), help="baseline JSON file")
+    parser.add_argument('--save', action='store_true', help="write the results as the new baseline")
+    parser.add_argument('--quick', action='store_true', help="smaller input sizes")
+    parser.add_argument('--only', help="only run benchmarks whose name contains this")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc pass")
+    args = parser.parse_args()
+
+    register_benchmarks(args.quick)
+    results = run_benchmarks(args.only, memory=not args.no_memory)
+    misses = check_targets(results)
+    for message in misses:
+        print(f"MISSED TARGET {message}")
+
+    baseline_path = Path(args.baseline)
+    if args.save:
+        previous = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+        measured = {name: result for name, result in results.items() if 'skipped' not in result}
+        previous.setdefault('results', {}).update(measured)
+        previous['machine'] = {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        }
+        previous['updated'] = datetime.now(timezone.utc).isoformat()
+        baseline_path.write_text(json.dumps(previous, indent=2, sort_keys=True))
+        print(f"Baseline written to {baseline_path}")
+        return 1 if misses else 0
+
+    if not baseline_path.exists():
+        print(f"No baseline at {baseline_path}; run with --save to record one")
+        return 1 if misses else 0
+
+    regressions = compare(results, json.loads(baseline_path.read_text()).get('results', {}), args.tolerance)
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    if not regressions:
+        print("No regressions against the baseline")
+    return 1 if regressions or misses else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
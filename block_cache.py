@@ -0,0 +1,70 @@
+import threading
+from collections import OrderedDict
+
+from connections import get_web3, resolve_chain
+from rpc_batch import batch_request
+
+CACHE_SIZE = 4096  # block headers kept per chain
+BATCH_LIMIT = 100  # blocks requested per JSON-RPC batch
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+class BlockHeaderCache:
+    """
+        Bounded LRU cache of block timestamps for one chain. Missing blocks are
+        fetched together in JSON-RPC batches, so enriching a set of events costs at
+        most one request per distinct block, and usually far fewer round-trips
+    """
+
+    def __init__(self, w3, maxsize=CACHE_SIZE, batch_limit=BATCH_LIMIT):
+        self.w3 = w3
+        self.maxsize = maxsize
+        self.batch_limit = batch_limit
+        self.blocks = OrderedDict()  # block number -> timestamp
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def fetch(self, block_numbers):
+        """Returns {block number: timestamp} straight from the node, in one batch if the provider allows"""
+        blocks = batch_request(self.w3, [
+            ('eth_getBlockByNumber', [hex(n), False]) for n in block_numbers
+        ])
+        return {n: int(block['timestamp'], 16) for n, block in zip(block_numbers, blocks)}
+
+    def timestamps(self, block_numbers):
+        """Returns {block number: timestamp} for every block in block_numbers"""
+        wanted = set(block_numbers)
+        found = {}
+        with self._lock:
+            for n in wanted:
+                if n in self.blocks:
+                    self.blocks.move_to_end(n)
+                    found[n] = self.blocks[n]
+            self.hits += len(found)
+
+        missing = sorted(wanted - found.keys())
+        self.misses += len(missing)
+        for i in range(0, len(missing), self.batch_limit):
+            fetched = self.fetch(missing[i:i + self.batch_limit])
+            found.update(fetched)
+            with self._lock:
+                self.blocks.update(fetched)
+                while len(self.blocks) > self.maxsize:
+                    self.blocks.popitem(last=False)
+        return found
+
+    def timestamp(self, block_number):
+        return self.timestamps([block_number])[block_number]
+
+
+def get_header_cache(chain):
+    """Returns the shared BlockHeaderCache for chain"""
+    chain = resolve_chain(chain)
+    with _caches_lock:
+        cache = _caches.get(chain)
+        if cache is None:
+            cache = _caches[chain] = BlockHeaderCache(get_web3(chain))
+    return cache
@@ -1,88 +1,103 @@
+from concurrent.futures import Future
+from functools import partial
+import requests
 from web3 import Web3
+from web3.exceptions import TimeExhausted
 from datetime import datetime
-import json
+from bridge_state import STATE_DB, SUBMITTED, CONFIRMED, FAILED, get_cursor, get_cursor_hash, set_cursor, event_key, \
+    claim_event, mark_event, failed_events, stage_events, staged_blocks, confirmed_events, unstage_event, \
+    drop_staged_from, relayed_events, submitted_relays, record_block_hashes, recorded_block_hashes
+from config import load_config
+from fees import transaction_params
+from connections import get_web3, get_contract, pinned
+from logscan import LogScanner
+from nonce_manager import get_nonce_manager, is_already_known, is_nonce_too_low
+from receipts import get_receipt_tracker, normalize_hash
+from rpc_batch import batch_request
+
+INITIAL_LOOKBACK = 50  # blocks scanned on the very first run of a chain
+MAX_SCAN_RANGE = 2000  # largest block window requested in one eth_getLogs call
+STUCK_TIMEOUT = 120  # seconds a relay may stay pending before it is re-sent with higher fees
+MAX_FEE_BUMPS = 3
+NONCE_RESYNCS = 1  # times a send rejected for "nonce too low" is retried on a resynced nonce
+
+# Blocks an event must be buried under before it is relayed
+CONFIRMATIONS = {
+    'source': 3,  # Avalanche finalizes within a couple of blocks
+    'destination': 15,  # BSC
+}
+
+# Events found on one chain are relayed to the other
+RELAY_CHAIN = {
+    'source': 'destination',
+    'destination': 'source',
+}
+
+# Batch entrypoints of the bridge contracts. Contracts deployed without them
+# (check the ABI in contract_info.json) get one transaction per event instead
+BATCH_FUNCTIONS = {
+    'wrap': 'wrapBatch',
+    'withdraw': 'withdrawBatch',
+}
+MAX_BATCH_SIZE = 50  # events relayed in one batch transaction, keeping it well under the block gas limit
+
+_scanners = {}  # chain -> LogScanner, kept so the window it has learned carries over between scans
 
 def connect_to(chain):
-    """Connect to the appropriate blockchain network"""
-    if chain == 'source':
-        # Avalanche Testnet (Fuji)
-        api_url = "https://api.avax-test.network/ext/bc/C/rpc"
-    elif chain == 'destination':
-        # BSC Testnet
-        api_url = "https://data-seed-prebsc-1-s1.binance.org:8545/"
-    else:
+    """Connect to the appropriate blockchain network (connections are shared and kept alive)"""
+    if chain not in ['source', 'destination']:
         raise ValueError("Invalid chain name")
-    
-    w3 = Web3(Web3.HTTPProvider(api_url))
-    
 
-    
-    return w3
+    return get_web3(chain)
 
 def get_contract_info(chain, contract_info_path="contract_info.json"):
-    """Load contract information from JSON file"""
+    """
+        Return the ChainConfig (address, abi, event topics) for chain from the cached
+        contract info. It also supports the dict access of the raw entry (info['address'])
+    """
     try:
-        with open(contract_info_path, 'r') as f:
-            contracts = json.load(f)
-        return contracts[chain]
+        return load_config(contract_info_path).chain(chain)
     except Exception as e:
         print(f"Failed to read contract info: {e}")
         return None
 
 def get_warden_key(contract_info_path="contract_info.json"):
-    """Get the warden's private key from contract info"""
+    """Get the warden's (0x-prefixed) private key from the cached contract info"""
     try:
-        with open(contract_info_path, 'r') as f:
-            data = json.load(f)
-        return data['warden_key']
+        return load_config(contract_info_path).warden_key
     except Exception as e:
         print(f"Failed to read warden key: {e}")
         return None
 
-def scan_blocks(chain, contract_info_path="contract_info.json"):
-    """Scan recent blocks for bridge events"""
+def scan_blocks(chain, contract_info_path="contract_info.json", state_db=STATE_DB):
+    """
+        Scan new blocks for bridge events, resuming after the last block recorded
+        in the state database. New events are staged with their block hashes and
+        only handled once they are CONFIRMATIONS blocks deep. Before scanning
+        forward, the hashes recorded for recently scanned blocks are checked, and
+        if any block was reorged out (with or without events in it) the staged
+        events from there on are dropped and those blocks rescanned
+    """
     if chain not in ['source', 'destination']:
         print(f"Invalid chain: {chain}")
         return 0
 
     try:
-        w3 = connect_to(chain)
-        contract_data = get_contract_info(chain, contract_info_path)
-        if not contract_data:
+        staged = stage_new_events(chain, contract_info_path, state_db)
+        if staged is None:
             return 0
+        events, confirmed_upto = staged
+        event_name = 'Deposit' if chain == 'source' else 'Unwrap'
+        for event in events:
+            print(f"[{datetime.utcnow()}] Found {event_name} event: {event}")
+
+        # Relays are sent back to back (batched where the contract allows) and only
+        # then waited on, so a burst of events costs roughly one confirmation
+        in_flight = relay_events(chain, events, contract_info_path, state_db, wait=False)
+        for group, tx_hash in in_flight:
+            confirm_relay(chain, group, tx_hash, contract_info_path, state_db)
 
-        contract_address = Web3.to_checksum_address(contract_data['address'])
-        contract_abi = contract_data['abi']
-        contract = w3.eth.contract(address=contract_address, abi=contract_abi)
-        
-        current_block = w3.eth.block_number
-        from_block = max(0, current_block - 50)  # Scan more blocks to catch events
-
-        print(f"[{datetime.utcnow()}] Scanning blocks {from_block} to {current_block} on {chain} chain")
-
-        if chain == 'source':
-            # Look for Deposit events on source chain
-            events = contract.events.Deposit.create_filter(
-                from_block=from_block, 
-                to_block=current_block
-            ).get_all_entries()
-            
-            for event in events:
-                print(f"[{datetime.utcnow()}] Found Deposit event: {event}")
-                handle_deposit_event(event, contract_info_path)
-                
-        elif chain == 'destination':
-            # Look for Unwrap events on destination chain
-            events = contract.events.Unwrap.create_filter(
-                from_block=from_block, 
-                to_block=current_block
-            ).get_all_entries()
-            
-            print(f"[{datetime.utcnow()}] Found {len(events)} Unwrap events")
-            
-            for event in events:
-                print(f"[{datetime.utcnow()}] Found Unwrap event: {event}")
-                handle_unwrap_event(event, contract_info_path)
+        complete_released(chain, events, confirmed_upto, state_db)
 
     except Exception as e:
         print(f"Error scanning blocks on {chain}: {e}")
@@ -90,119 +105,518 @@ def scan_blocks(chain, contract_info_path="contract_info.json"):
 
     return 1
 
-def handle_deposit_event(deposit_event, contract_info_path="contract_info.json"):
-    """Handle Deposit event by calling wrap() on destination chain"""
-    print(f"[{datetime.utcnow()}] Handling Deposit event - calling wrap() on destination chain")
+def stage_new_events(chain, contract_info_path="contract_info.json", state_db=STATE_DB):
+    """
+        The scanning half of scan_blocks(), also run by the daemon's pollers: check
+        for reorgs, stage the bridge events of the blocks since the cursor and
+        record their hashes. Every read goes to one pinned endpoint from the calling
+        thread. Returns (events due for relaying, block they are confirmed up to),
+        or None if the contract info cannot be read
+    """
+    w3 = connect_to(chain)
+    contract_data = get_contract_info(chain, contract_info_path)
+    if not contract_data:
+        return None
 
-    # Extract event arguments
-    args = deposit_event['args']
-    token = Web3.to_checksum_address(args['token'])
-    recipient = Web3.to_checksum_address(args['recipient'])
-    amount = args['amount']
-
-    # Connect to destination chain
-    dest_w3 = connect_to('destination')
-    dest_contract_data = get_contract_info('destination', contract_info_path)
-    if not dest_contract_data:
-        print("Failed to get destination contract data")
-        return
+    contract = get_contract(chain, contract_data.address, contract_data.abi)
 
-    dest_contract_address = Web3.to_checksum_address(dest_contract_data['address'])
-    dest_contract_abi = dest_contract_data['abi']
-    dest_contract = dest_w3.eth.contract(address=dest_contract_address, abi=dest_contract_abi)
-    
-    # Get warden key and create account
-    warden_key = get_warden_key(contract_info_path)
-    if not warden_key:
-        print("Failed to get warden key")
+    # The head, the logs up to it and the reorg check must all come from the same
+    # node: a lagging endpoint returns no logs above its own head
+    with pinned(w3):
+        latest = w3.eth.get_block('latest')
+        current_block = latest['number']
+        # A reorg since the last scan moves the cursor back below the fork
+        check_reorg(chain, state_db, current_block)
+        last_block = get_cursor(chain, state_db)
+        if last_block is None:
+            from_block = max(0, current_block - INITIAL_LOOKBACK)
+        else:
+            from_block = last_block + 1
+
+        # Look for Deposit events on source chain and Unwrap events on destination chain
+        event_name = 'Deposit' if chain == 'source' else 'Unwrap'
+
+        # Windows shrink automatically if the provider rejects a range as too large
+        scanner = get_log_scanner(chain, getattr(contract.events, event_name))
+        for window_start, window_end, events in scanner.iter_windows(from_block, current_block):
+            print(f"[{datetime.utcnow()}] Scanned blocks {window_start} to {window_end} on {chain} chain: {len(events)} {event_name} events")
+            stage_events(chain, events, state_db)
+            tip_hash = Web3.to_hex(latest['hash']) if window_end == current_block else None
+            set_cursor(chain, window_end, state_db, tip_hash)
+        record_recent_blocks(chain, from_block, latest, state_db)
+
+        return release_confirmed(chain, current_block, state_db)
+
+def get_log_scanner(chain, event):
+    """Returns the LogScanner of chain, keeping the window it has learned, set to scan event"""
+    scanner = _scanners.get(chain)
+    if scanner is None:
+        scanner = _scanners[chain] = LogScanner(event, window=MAX_SCAN_RANGE, max_window=MAX_SCAN_RANGE)
+    scanner.event = event
+    return scanner
+
+def check_reorg(chain, state_db=STATE_DB, head=None):
+    """
+        Compare the hashes recorded for recently scanned blocks, staged blocks and
+        the scan cursor with the chain's canonical hashes. On a mismatch, drop staged events from the
+        fork point up and move the cursor back so those blocks are scanned again.
+        Blocks above head (which a node lagging behind an earlier scan's node
+        does not have yet) are left alone, and blocks already released as
+        confirmed are never rescanned.
+        Returns the fork block, or None if nothing changed
+    """
+    w3 = connect_to(chain)
+    recorded = recorded_block_hashes(chain, state_db)
+    recorded.update(staged_blocks(chain, state_db))
+    cursor = get_cursor_hash(chain, state_db)
+    if cursor is not None and cursor[1] is not None:
+        recorded[cursor[0]] = cursor[1]
+    if head is not None:
+        recorded = {n: h for n, h in recorded.items() if n <= head}
+    if not recorded:
+        return None
+
+    numbers = sorted(recorded)
+    blocks = batch_request(w3, [('eth_getBlockByNumber', [hex(n), False]) for n in numbers])
+    mismatched = [
+        n for n, block in zip(numbers, blocks)
+        if block is None or block['hash'].lower() != recorded[n].lower()
+    ]
+    if not mismatched:
+        return None
+
+    # The fork lies after the last block whose hash still matches. Without such a block,
+    # assume it can be anywhere in the unconfirmed range below the first mismatch
+    first_bad = min(mismatched)
+    still_good = [n for n in numbers if n < first_bad]
+    if still_good:
+        fork = max(still_good) + 1
+    else:
+        confirmed = get_cursor(f"{chain}:confirmed", state_db)
+        fork = max(numbers[-1] - CONFIRMATIONS[chain], -1 if confirmed is None else confirmed) + 1
+    fork = max(0, min(fork, first_bad))
+
+    dropped = drop_staged_from(chain, fork, state_db)
+    set_cursor(chain, fork - 1, state_db)
+    print(f"[{datetime.utcnow()}] Reorg detected on {chain} chain at block {fork}: dropped {dropped} staged events, rescanning")
+    return fork
+
+def record_recent_blocks(chain, from_block, latest, state_db=STATE_DB):
+    """
+        Record the hashes of the newly scanned blocks (from_block up to the latest
+        block) that are still within reorg range, and forget older ones. Only the
+        last CONFIRMATIONS[chain] + 1 blocks are kept: deeper blocks have been
+        released already, and one block below them anchors the fork search
+    """
+    current_block = latest['number']
+    keep_from = current_block - CONFIRMATIONS[chain]
+    numbers = list(range(max(from_block, keep_from), current_block))
+    blocks = batch_request(connect_to(chain), [('eth_getBlockByNumber', [hex(n), False]) for n in numbers])
+    hashes = {n: block['hash'] for n, block in zip(numbers, blocks) if block is not None}
+    if from_block <= current_block:
+        hashes[current_block] = Web3.to_hex(latest['hash'])
+    record_block_hashes(chain, hashes, keep_from, state_db)
+
+def release_confirmed(chain, current_block, state_db=STATE_DB):
+    """
+        Return the staged events at least CONFIRMATIONS[chain] blocks deep (oldest
+        first), followed by earlier events whose relay failed and is due for a retry
+        or whose claim was abandoned by a run that died before sending, and the
+        block they are confirmed up to. Callers run check_reorg() first
+    """
+    confirmed_upto = current_block - CONFIRMATIONS[chain]
+    events = confirmed_events(chain, confirmed_upto, state_db)
+    released = set(event_key(event) for event in events)
+    events.extend(event for event in failed_events(chain, state_db) if event_key(event) not in released)
+    return events, confirmed_upto
+
+def complete_released(chain, events, confirmed_upto=None, state_db=STATE_DB):
+    """
+        Forget staged events that have been handed to their handlers and, if
+        confirmed_upto is given, record that blocks up to it have been released
+    """
+    for event in events:
+        unstage_event(chain, *event_key(event), state_db)
+    if confirmed_upto is None:
         return
-        
-    # Ensure key has 0x prefix
-    if not warden_key.startswith('0x'):
-        warden_key = '0x' + warden_key
-        
-    warden_account = dest_w3.eth.account.from_key(warden_key)
+    previous = get_cursor(f"{chain}:confirmed", state_db)
+    if previous is None or confirmed_upto > previous:
+        set_cursor(f"{chain}:confirmed", confirmed_upto, state_db)
+
+def handle_deposit_event(deposit_event, contract_info_path="contract_info.json", state_db=STATE_DB, wait=True):
+    """
+        Handle Deposit event by calling wrap() on destination chain.
+        Returns the relay transaction hash, or None if nothing was sent.
+        With wait=False the caller is responsible for calling wait_for_relay()
+    """
+    print(f"[{datetime.utcnow()}] Handling Deposit event - calling wrap() on destination chain")
+    sent = relay_events('source', [deposit_event], contract_info_path, state_db, wait)
+    return sent[0][1] if sent else None
+
+def handle_unwrap_event(unwrap_event, contract_info_path="contract_info.json", state_db=STATE_DB, wait=True):
+    """
+        Handle Unwrap event by calling withdraw() on source chain.
+        Returns the relay transaction hash, or None if nothing was sent.
+        With wait=False the caller is responsible for calling wait_for_relay()
+    """
+    print(f"[{datetime.utcnow()}] Handling Unwrap event - calling withdraw() on source chain")
+    sent = relay_events('destination', [unwrap_event], contract_info_path, state_db, wait)
+    return sent[0][1] if sent else None
+
+def relay_call(chain, event):
+    """Returns the (function name, args) that relays event, found on chain, to the other chain"""
+    args = event['args']
+    if chain == 'source':
+        # Deposit(token, recipient, amount) -> wrap(token, recipient, amount)
+        return 'wrap', (
+            Web3.to_checksum_address(args['token']),
+            Web3.to_checksum_address(args['recipient']),
+            args['amount']
+        )
+    # Unwrap(underlying_token, wrapped_token, frm, to, amount) -> withdraw(underlying_token, to, amount)
+    return 'withdraw', (
+        Web3.to_checksum_address(args['underlying_token']),
+        Web3.to_checksum_address(args['to']),
+        args['amount']
+    )
+
+def has_function(contract_data, fn_name):
+    return any(item.get('type') == 'function' and item.get('name') == fn_name for item in contract_data.abi)
+
+def relay_events(chain, events, contract_info_path="contract_info.json", state_db=STATE_DB, wait=True, batch=True):
+    """
+        Relay events found on chain to the other chain. If the target contract has a
+        batch entrypoint (and batch is set), up to MAX_BATCH_SIZE events share one
+        transaction; otherwise each event gets its own transaction, all sent back to back. Every event keeps
+        its own ledger entry, and events already relayed are skipped.
+        Returns a list of (events, tx_hash), one per transaction sent.
+        With wait=False the caller is responsible for calling confirm_relay() on each
+    """
+    claimed = []
+    for event in events:
+        event_tx, log_index = event_key(event)
+        if claim_event(chain, event_tx, log_index, state_db, event):
+            claimed.append(event)
+        else:
+            print(f"[{datetime.utcnow()}] Event {event_tx}:{log_index} on {chain} chain already claimed or relayed, skipping")
+    if not claimed:
+        return []
+
+    target = RELAY_CHAIN[chain]
+    fn_name = 'wrap' if chain == 'source' else 'withdraw'
+    batch_fn = BATCH_FUNCTIONS[fn_name]
+    contract_data = get_contract_info(target, contract_info_path)
+    if batch and len(claimed) > 1 and contract_data and has_function(contract_data, batch_fn):
+        groups = [claimed[i:i + MAX_BATCH_SIZE] for i in range(0, len(claimed), MAX_BATCH_SIZE)]
+    else:
+        groups = [[event] for event in claimed]
+
+    sent = []
+    for group in groups:
+        calls = [relay_call(chain, event)[1] for event in group]
+        if len(group) == 1:
+            tx_hash = send_relay(target, fn_name, calls[0], contract_info_path)
+        else:
+            # wrapBatch/withdrawBatch take one array per argument
+            columns = tuple(list(column) for column in zip(*calls))
+            tx_hash = send_relay(target, batch_fn, columns, contract_info_path)
+            if tx_hash is not None:
+                print(f"[{datetime.utcnow()}] Relayed {len(group)} events from {chain} chain in one {batch_fn}() transaction")
+
+        for event in group:
+            event_tx, log_index = event_key(event)
+            if tx_hash is None:
+                mark_event(chain, event_tx, log_index, FAILED, db_path=state_db)
+            else:
+                mark_event(chain, event_tx, log_index, SUBMITTED, Web3.to_hex(tx_hash), state_db)
+        if tx_hash is not None:
+            sent.append((group, tx_hash))
+
+    if wait:
+        for group, tx_hash in sent:
+            confirm_relay(chain, group, tx_hash, contract_info_path, state_db)
+    return sent
+
+def confirm_relay(chain, events, tx_hash, contract_info_path="contract_info.json", state_db=STATE_DB):
+    """
+        Wait for the relay transaction tx_hash carrying events (found on chain) and
+        record each event's outcome. A reverted batch is retried one event per
+        transaction, so one bad event cannot fail the events batched with it
+    """
+    keys = [event_key(event) for event in events]
+    receipt = wait_for_relays(RELAY_CHAIN[chain], chain, keys, tx_hash, contract_info_path, state_db)
+    if receipt is not None and receipt['status'] != 1 and len(events) > 1:
+        print(f"[{datetime.utcnow()}] Batch relay reverted, retrying its {len(events)} events one by one")
+        singles = relay_events(chain, events, contract_info_path, state_db, wait=False, batch=False)
+        for group, single_hash in singles:
+            wait_for_relays(RELAY_CHAIN[chain], chain, [event_key(e) for e in group], single_hash, contract_info_path, state_db)
+    return receipt
 
+def get_warden_account(contract_info_path="contract_info.json"):
+    """Returns the warden's (0x-prefixed) private key and account, or (None, None)"""
     try:
-        # Estimate gas and build transaction
-        gas_estimate = dest_contract.functions.wrap(token, recipient, amount).estimate_gas({
-            'from': warden_account.address
-        })
-        
-        tx = dest_contract.functions.wrap(token, recipient, amount).build_transaction({
-            'from': warden_account.address,
-            'nonce': dest_w3.eth.get_transaction_count(warden_account.address, 'pending'),
-            'gas': gas_estimate + 10000,  # Add buffer for gas
-            'gasPrice': dest_w3.eth.gas_price
-        })
-        
-        # Sign and send transaction
-        signed = dest_w3.eth.account.sign_transaction(tx, warden_key)
-        tx_hash = dest_w3.eth.send_raw_transaction(signed.raw_transaction)
-        receipt = dest_w3.eth.wait_for_transaction_receipt(tx_hash)
-        
-        print(f"[{datetime.utcnow()}] Wrap transaction confirmed: {receipt['transactionHash'].hex()}")
-        
+        config = load_config(contract_info_path)
     except Exception as e:
-        print(f"Error in wrap transaction: {e}")
+        print(f"Failed to read warden key: {e}")
+        return None, None
 
-def handle_unwrap_event(unwrap_event, contract_info_path="contract_info.json"):
-    """Handle Unwrap event by calling withdraw() on source chain"""
-    print(f"[{datetime.utcnow()}] Handling Unwrap event - calling withdraw() on source chain")
+    if not config.warden_key:
+        print("Failed to get warden key")
+        return None, None
 
-    # Extract event arguments
-    args = unwrap_event['args']
-    underlying_token = Web3.to_checksum_address(args['underlying_token'])
-    recipient = Web3.to_checksum_address(args['to'])
-    amount = args['amount']
-
-    # Connect to source chain
-    source_w3 = connect_to('source')
-    source_contract_data = get_contract_info('source', contract_info_path)
-    if not source_contract_data:
-        print("Failed to get source contract data")
-        return
+    return config.warden_key, config.warden_account
+
+def send_relay(chain, fn_name, fn_args, contract_info_path="contract_info.json"):
+    """
+        Build, sign and send a warden transaction calling fn_name(*fn_args) on the
+        bridge contract of chain, taking the nonce from the local nonce manager.
+        Returns the transaction hash without waiting for it to be mined, or None on failure
+    """
+    w3 = connect_to(chain)
+    contract_data = get_contract_info(chain, contract_info_path)
+    if not contract_data:
+        print(f"Failed to get {chain} contract data")
+        return None
 
-    source_contract_address = Web3.to_checksum_address(source_contract_data['address'])
-    source_contract_abi = source_contract_data['abi']
-    source_contract = source_w3.eth.contract(address=source_contract_address, abi=source_contract_abi)
-    
-    # Get warden key and create account
-    warden_key = get_warden_key(contract_info_path)
+    contract = get_contract(chain, contract_data.address, contract_data.abi)
+
+    warden_key, warden_account = get_warden_account(contract_info_path)
     if not warden_key:
-        print("Failed to get warden key")
-        return
-        
-    # Ensure key has 0x prefix
-    if not warden_key.startswith('0x'):
-        warden_key = '0x' + warden_key
-        
-    warden_account = source_w3.eth.account.from_key(warden_key)
+        return None
+
+    nonce = None
+    signed = None
+    try:
+        nonces = get_nonce_manager(chain, w3, warden_account.address)
+        function = getattr(contract.functions, fn_name)(*fn_args)
+
+        # Gas limit, fees and chain id come from the fee oracle's caches, which only
+        # go to the node (in one batch) for new calls and about once a block for fees
+        params = transaction_params(chain, contract, fn_name, fn_args, warden_account.address)
+
+        for attempt in range(NONCE_RESYNCS + 1):
+            signed = None
+            nonce = nonces.allocate()
+            tx = function.build_transaction(dict(params, **{
+                'from': warden_account.address,
+                'nonce': nonce,
+            }))
+
+            # Sign and send transaction
+            signed = w3.eth.account.sign_transaction(tx, warden_key)
+            try:
+                tx_hash = w3.eth.send_raw_transaction(signed.raw_transaction)
+            except (requests.Timeout, requests.ConnectionError) as e:
+                # The node may have accepted the transaction before the connection failed.
+                # Treat it as sent: waiting on its hash settles it either way, and a
+                # replacement reuses its nonce, so the events are never relayed twice
+                print(f"[{datetime.utcnow()}] Sending {fn_name} on {chain} chain failed ({e}), tracking it as possibly sent")
+                tx_hash = signed.hash
+            except Exception as e:
+                if attempt == NONCE_RESYNCS or not is_nonce_too_low(e):
+                    raise
+                # Something else used the nonce (say another warden process); nothing of
+                # ours went out, so resync with the chain and send again on a fresh nonce
+                print(f"[{datetime.utcnow()}] Nonce {nonce} on {chain} chain already used, resyncing")
+                nonces.release(nonce)
+                nonces.reconcile()
+                continue
+            nonces.record(nonce, tx, tx_hash)
+            return tx_hash
+
+    except Exception as e:
+        print(f"Error in {fn_name} transaction: {e}")
+        if signed is not None and not is_nonce_too_low(e):
+            try:
+                sent = is_already_known(e) or nonces.was_broadcast(signed.hash)
+            except Exception as check_error:
+                print(f"Failed to check whether {fn_name} was sent on {chain}: {check_error}")
+                sent = True
+            if sent:
+                # The transaction went out despite the error; reusing its nonce
+                # would replace it, so track it like any other relay instead
+                nonces.record(nonce, tx, signed.hash)
+                return signed.hash
+        if nonce is not None:
+            # The nonce was never used; hand it back and resync with the chain
+            nonces.release(nonce)
+            try:
+                nonces.reconcile()
+            except Exception as reconcile_error:
+                print(f"Failed to reconcile nonces on {chain}: {reconcile_error}")
+        return None
+
+def wait_for_relay(chain, event_chain, event_tx, log_index, tx_hash, contract_info_path="contract_info.json", state_db=STATE_DB):
+    """
+        Wait for the relay transaction tx_hash on chain to be mined and record the
+        outcome of the (event_chain, event_tx, log_index) event in the ledger
+    """
+    return wait_for_relays(chain, event_chain, [(event_tx, log_index)], tx_hash, contract_info_path, state_db)
+
+def wait_for_relays(chain, event_chain, event_keys, tx_hash, contract_info_path="contract_info.json", state_db=STATE_DB):
+    """
+        Wait for the relay transaction tx_hash on chain to be mined and record the
+        outcome of each (event_tx, log_index) event of event_chain it carries.
+        A transaction still pending after STUCK_TIMEOUT seconds is replaced with
+        higher fees, up to MAX_FEE_BUMPS times
+    """
+    try:
+        return RelayWait(chain, event_chain, event_keys, tx_hash, contract_info_path, state_db).start().result()
+    except Exception as e:
+        print(f"Error waiting for relay transaction on {chain}: {e}")
+        return None
+
+class RelayWait:
+    """
+        One relay transaction on chain being waited on: its nonce, its hashes (the
+        original, then fee-bumped replacements) and the events of event_chain it
+        carries. The wait runs on the shared receipt tracker's callbacks, so it
+        holds no thread: wait_for_relays() blocks on start()'s Future and the
+        daemon awaits it
+    """
+
+    def __init__(self, chain, event_chain, event_keys, tx_hash, contract_info_path="contract_info.json", state_db=STATE_DB):
+        self.chain = chain
+        self.event_chain = event_chain
+        self.event_keys = list(event_keys)
+        self.state_db = state_db
+        self.warden_key, warden_account = get_warden_account(contract_info_path)
+        if not self.warden_key:
+            raise ValueError("no warden key to replace stuck relays with")
+        self.nonces = get_nonce_manager(chain, connect_to(chain), warden_account.address)
+        self.nonce = self.nonces.nonce_of(tx_hash)
+        self.hashes = self.nonces.hashes_of(self.nonce) if self.nonce is not None else [tx_hash]
+        self.tracker = get_receipt_tracker(chain, state_db)
+        self.done = Future()
+
+    def start(self):
+        """
+            Returns a Future resolving to the relay's receipt once the outcome of its
+            events is recorded, or to None if it is still pending after MAX_FEE_BUMPS
+            replacements (its events are then left as submitted, never relayed twice)
+        """
+        self._track(0)
+        return self.done
+
+    def _track(self, attempt, last=False):
+        # The shared tracker polls every hash of this and all other pending relays
+        # in one batch, so an earlier version of a replaced transaction is caught too
+        future = self.tracker.track(self.hashes, timeout=STUCK_TIMEOUT)
+        future.add_done_callback(partial(self._tracked, attempt, last))
+
+    def _tracked(self, attempt, last, future):
+        try:
+            try:
+                receipt = future.result()
+            except TimeExhausted:
+                if last or attempt == MAX_FEE_BUMPS:
+                    receipt = None
+                elif self.bump():
+                    return self._track(attempt + 1)
+                else:
+                    # The nonce has been mined meanwhile; the tracker's next poll finds
+                    # whichever of the hashes it was (or none, if something else used it)
+                    return self._track(attempt + 1, last=True)
+            self.done.set_result(self.settle(receipt))
+        except Exception as e:
+            self.done.set_exception(e)
+
+    def mark_all(self, state, relay_tx=None):
+        for event_tx, log_index in self.event_keys:
+            mark_event(self.event_chain, event_tx, log_index, state, relay_tx, self.state_db)
+
+    def bump(self):
+        """
+            Replace the stuck transaction with one paying higher fees. Returns False if
+            there is nothing to replace: its nonce is unknown or has been mined meanwhile
+        """
+        if self.nonce is None:
+            return False
+        new_hash = self.nonces.replace(self.nonce, self.warden_key)
+        if new_hash is None:
+            return False
+        print(f"[{datetime.utcnow()}] Relay {Web3.to_hex(self.hashes[-1])} stuck, replaced by {Web3.to_hex(new_hash)}")
+        self.hashes.append(new_hash)
+        self.mark_all(SUBMITTED, Web3.to_hex(new_hash))
+        return True
+
+    def settle(self, receipt):
+        """Record the outcome of every event for receipt (None while still pending) and return it"""
+        if receipt is None:
+            # Leave the events as submitted so they are never relayed twice
+            print(f"[{datetime.utcnow()}] Relay {Web3.to_hex(self.hashes[-1])} on {self.chain} chain still pending")
+            return None
+
+        if self.nonce is not None:
+            self.nonces.confirm(self.nonce)
 
+        if receipt['status'] != 1:
+            self.mark_all(FAILED)
+            print(f"[{datetime.utcnow()}] Relay transaction reverted: {Web3.to_hex(receipt['transactionHash'])}")
+            return receipt
+
+        self.mark_all(CONFIRMED, Web3.to_hex(receipt['transactionHash']))
+        print(f"[{datetime.utcnow()}] Relay transaction confirmed: {Web3.to_hex(receipt['transactionHash'])}")
+        return receipt
+
+def resume_relays(contract_info_path="contract_info.json", state_db=STATE_DB):
+    """
+        Pick up the relay transactions a previous run was still waiting on and
+        record the outcome of their events once they are mined.
+        Returns the Futures of the resumed transactions
+    """
+    futures = []
+    timeout = STUCK_TIMEOUT * (MAX_FEE_BUMPS + 1)
+    for event_chain, chain in RELAY_CHAIN.items():
+        tracker = get_receipt_tracker(chain, state_db)
+        resumed = tracker.resume(timeout=timeout)
+        # Relays sent without waiting (scan_blocks() and the daemon confirm them one at
+        # a time) are only tracked once waited on; a run that died first left them
+        # in the ledger alone
+        tracked = set(tx_hash for hashes, _ in resumed for tx_hash in hashes)
+        for relay_tx in submitted_relays(event_chain, state_db):
+            if normalize_hash(relay_tx) not in tracked:
+                resumed.append(([relay_tx], tracker.track(relay_tx, timeout)))
+
+        for hashes, future in resumed:
+            event_keys = relayed_events(event_chain, hashes, state_db)
+            if event_keys:
+                print(f"[{datetime.utcnow()}] Resuming relay {hashes[-1]} on {chain} chain for {len(event_keys)} events")
+                future.add_done_callback(partial(settle_relay, event_chain, event_keys, state_db))
+            futures.append(future)
+    return futures
+
+def settle_relay(event_chain, event_keys, state_db, future):
+    """Record the outcome of a resumed relay transaction for each of its events"""
     try:
-        # Estimate gas and build transaction
-        gas_estimate = source_contract.functions.withdraw(underlying_token, recipient, amount).estimate_gas({
-            'from': warden_account.address
-        })
-        
-        tx = source_contract.functions.withdraw(underlying_token, recipient, amount).build_transaction({
-            'from': warden_account.address,
-            'nonce': source_w3.eth.get_transaction_count(warden_account.address, 'pending'),
-            'gas': gas_estimate + 10000,  # Add buffer for gas
-            'gasPrice': source_w3.eth.gas_price
-        })
-        
-        # Sign and send transaction
-        signed = source_w3.eth.account.sign_transaction(tx, warden_key)
-        tx_hash = source_w3.eth.send_raw_transaction(signed.raw_transaction)
-        receipt = source_w3.eth.wait_for_transaction_receipt(tx_hash)
-        
-        print(f"[{datetime.utcnow()}] Withdraw transaction confirmed: {receipt['transactionHash'].hex()}")
-        
+        receipt = future.result()
+    except TimeExhausted as e:
+        # Leave the events as submitted so they are never relayed twice
+        print(f"[{datetime.utcnow()}] Resumed relay still pending: {e}")
+        return
     except Exception as e:
-        print(f"Error in withdraw transaction: {e}")
+        print(f"Error resuming relay: {e}")
+        return
+
+    tx_hash = Web3.to_hex(receipt['transactionHash'])
+    state = CONFIRMED if receipt['status'] == 1 else FAILED
+    for event_tx, log_index in event_keys:
+        mark_event(event_chain, event_tx, log_index, state, tx_hash if state == CONFIRMED else None, state_db)
+    print(f"[{datetime.utcnow()}] Resumed relay {tx_hash} {state}")
 
 if __name__ == "__main__":
-    print(f"[{datetime.utcnow()}] Starting bridge script...")
-    scan_blocks('source')
-    scan_blocks('destination')
+    import sys
+    from concurrent.futures import wait
+
+    if '--once' in sys.argv[1:]:
+        print(f"[{datetime.utcnow()}] Starting bridge script...")
+        resumed = resume_relays()
+        scan_blocks('source')
+        scan_blocks('destination')
+        wait(resumed)
+    else:
+        import asyncio
+        from bridge_daemon import run_daemon
+
+        print(f"[{datetime.utcnow()}] Starting bridge daemon...")
+        asyncio.run(run_daemon())
@@ -0,0 +1,178 @@
+import asyncio
+from datetime import datetime
+
+import bridge
+from bridge_state import STATE_DB, event_key
+
+# Seconds between head checks on each chain (roughly the chain's block time)
+POLL_INTERVALS = {
+    'source': 2.0,
+    'destination': 3.0,
+}
+
+# Seconds a handler waits for more events to relay in the same batch
+BATCH_WINDOW = 0.5
+
+EVENT_NAMES = {
+    'source': 'Deposit',
+    'destination': 'Unwrap',
+}
+
+
+class BridgeDaemon:
+    """
+        Resident bridge service. Each chain gets a poller that watches for new
+        blocks and a handler that relays the events it finds, all sharing one
+        event loop, so both chains are served concurrently and connections,
+        contract objects and the parsed contract_info.json stay warm.
+        The blocking work (RPC reads, SQLite) runs in worker threads; each poll
+        step runs in one thread so its reads stay pinned to one endpoint
+    """
+
+    def __init__(self, contract_info_path="contract_info.json", state_db=STATE_DB, poll_intervals=None, batch_window=BATCH_WINDOW):
+        self.contract_info_path = contract_info_path
+        self.state_db = state_db
+        self.poll_intervals = dict(POLL_INTERVALS, **(poll_intervals or {}))
+        self.batch_window = batch_window
+        self.queues = {}
+        self.queued = {}  # chain -> keys of the events queued or being relayed
+
+    async def connect(self):
+        """Create the relay queues and warm the shared connection and contract object of each chain"""
+        for chain in EVENT_NAMES:
+            self.queues[chain] = asyncio.Queue()
+            self.queued[chain] = set()
+            await asyncio.to_thread(self.warm, chain)
+
+    def warm(self, chain):
+        contract_data = bridge.get_contract_info(chain, self.contract_info_path)
+        if contract_data:
+            bridge.get_contract(chain, contract_data.address, contract_data.abi)
+
+    async def poll(self, chain):
+        """
+            Watch chain for new blocks and stage the bridge events in each new window,
+            after rolling back any blocks reorged out since the last poll (the same
+            pinned scan as bridge.scan_blocks()). Confirmed events are queued for
+            their handler, which unstages them once it has claimed them; the poller
+            never waits for relays, so new blocks keep being scanned meanwhile
+        """
+        queue = self.queues[chain]
+        queued = self.queued[chain]
+
+        while True:
+            try:
+                staged = await asyncio.to_thread(
+                    bridge.stage_new_events, chain, self.contract_info_path, self.state_db
+                )
+                if staged is not None:
+                    released, confirmed_upto = staged
+                    new_events = [evt for evt in released if event_key(evt) not in queued]
+                    for evt in new_events:
+                        queued.add(event_key(evt))
+                        queue.put_nowait(evt)
+                    if new_events:
+                        print(f"[{datetime.utcnow()}] Queued {len(new_events)} {EVENT_NAMES[chain]} events on {chain} chain")
+                    # Released events stay staged until their handler claims them, so a
+                    # crash before then releases them again on the next run
+                    await asyncio.to_thread(
+                        bridge.complete_released, chain, [], confirmed_upto, self.state_db
+                    )
+
+            except Exception as e:
+                print(f"Error polling {chain} chain: {e}")
+
+            await asyncio.sleep(self.poll_intervals[chain])
+
+    async def handle(self, chain):
+        """
+            Relay queued events for chain; the blocking web3 calls run in worker threads.
+            Events arriving within batch_window of each other are relayed together
+            (up to bridge.MAX_BATCH_SIZE per transaction), and each transaction is
+            confirmed in its own task, so many relays can be in flight at once
+        """
+        loop = asyncio.get_running_loop()
+        queue = self.queues[chain]
+        confirmations = set()
+
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < bridge.MAX_BATCH_SIZE:
+                if not queue.empty():
+                    batch.append(queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                sent = await asyncio.to_thread(
+                    bridge.relay_events, chain, batch, self.contract_info_path, self.state_db, False
+                )
+                # Every event is now claimed (or was relayed already) and its ledger
+                # entry brings it back if the relay fails, so it can leave the staging area
+                await asyncio.to_thread(bridge.complete_released, chain, batch, None, self.state_db)
+            except Exception as e:
+                print(f"Error handling {EVENT_NAMES[chain]} events on {chain} chain: {e}")
+                sent = []
+            finally:
+                self.queued[chain].difference_update(event_key(evt) for evt in batch)
+
+            for group, tx_hash in sent:
+                task = asyncio.create_task(self.confirm(chain, group, tx_hash))
+                confirmations.add(task)
+                task.add_done_callback(confirmations.discard)
+
+    async def confirm(self, chain, events, tx_hash):
+        """
+            Wait for the relay transaction carrying events to be mined, then mark them
+            handled. A reverted batch is retried one event per transaction, like
+            bridge.confirm_relay() does
+        """
+        try:
+            receipt = await self.wait_relay(chain, events, tx_hash)
+            if receipt is not None and receipt['status'] != 1 and len(events) > 1:
+                print(f"[{datetime.utcnow()}] Batch relay reverted, retrying its {len(events)} events one by one")
+                singles = await asyncio.to_thread(
+                    bridge.relay_events, chain, events, self.contract_info_path, self.state_db, False, False
+                )
+                await asyncio.gather(*(self.wait_relay(chain, group, single_hash) for group, single_hash in singles))
+        except Exception as e:
+            print(f"Error confirming relay on {chain} chain: {e}")
+
+    async def wait_relay(self, chain, events, tx_hash):
+        """
+            Await the receipt of a relay transaction (replacing it with higher fees
+            while it is stuck) and record its events' outcome. The wait is registered
+            with the chain's receipt tracker, so no thread is held while it lasts
+        """
+        keys = [event_key(evt) for evt in events]
+        relay = await asyncio.to_thread(
+            bridge.RelayWait, bridge.RELAY_CHAIN[chain], chain, keys, tx_hash, self.contract_info_path, self.state_db
+        )
+        return await asyncio.wrap_future(relay.start())
+
+    async def run(self):
+        """Run the pollers and handlers for both chains until cancelled"""
+        await self.connect()
+        # Relays a previous run was still waiting on settle in the background
+        await asyncio.to_thread(bridge.resume_relays, self.contract_info_path, self.state_db)
+        tasks = []
+        for chain in EVENT_NAMES:
+            tasks.append(self.poll(chain))
+            tasks.append(self.handle(chain))
+        await asyncio.gather(*tasks)
+
+
+async def run_daemon(contract_info_path="contract_info.json", state_db=STATE_DB, poll_intervals=None, batch_window=BATCH_WINDOW):
+    """Entry point used by bridge.py's __main__"""
+    await BridgeDaemon(contract_info_path, state_db, poll_intervals, batch_window).run()
+
+
+if __name__ == "__main__":
+    asyncio.run(run_daemon())
@@ -0,0 +1,378 @@
+import json
+import sqlite3
+import threading
+import time
+from collections.abc import Mapping
+from pathlib import Path
+
+STATE_DB = Path(__file__).parent.absolute() / "bridge_state.db"
+
+# Relay states recorded in the processed-event ledger
+SEEN = 'seen'
+SUBMITTED = 'submitted'
+CONFIRMED = 'confirmed'
+FAILED = 'failed'
+
+CLAIM_TIMEOUT = 600  # seconds after which a claim whose relay was never recorded is presumed abandoned
+RETRY_DELAY = 60  # seconds a failed relay waits before it is retried
+MAX_RELAY_ATTEMPTS = 5  # relays attempted per event before it is left failed for good
+
+_local = threading.local()
+
+
+def connect_state(db_path=STATE_DB):
+    """
+        Returns a sqlite connection to the bridge state database at db_path,
+        creating the tables on first use. Connections are cached per thread
+        so callers can use this freely on the hot path
+    """
+    db_path = str(db_path)
+    conns = getattr(_local, 'conns', None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(db_path)
+    if conn is None:
+        conn = sqlite3.connect(db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cursors ("
+            " chain TEXT PRIMARY KEY,"
+            " block INTEGER NOT NULL,"
+            " updated REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS relay_events ("
+            " chain TEXT NOT NULL,"
+            " tx_hash TEXT NOT NULL,"
+            " log_index INTEGER NOT NULL,"
+            " state TEXT NOT NULL,"
+            " relay_tx TEXT,"
+            " updated REAL NOT NULL,"
+            " payload TEXT,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " PRIMARY KEY (chain, tx_hash, log_index)) WITHOUT ROWID"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS staged_events ("
+            " chain TEXT NOT NULL,"
+            " block_number INTEGER NOT NULL,"
+            " block_hash TEXT NOT NULL,"
+            " tx_hash TEXT NOT NULL,"
+            " log_index INTEGER NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " PRIMARY KEY (chain, tx_hash, log_index))"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS staged_events_block ON staged_events (chain, block_number)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS block_hashes ("
+            " chain TEXT NOT NULL,"
+            " block_number INTEGER NOT NULL,"
+            " block_hash TEXT NOT NULL,"
+            " PRIMARY KEY (chain, block_number)) WITHOUT ROWID"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS tracked_receipts ("
+            " chain TEXT NOT NULL,"
+            " tx_hash TEXT NOT NULL,"
+            " watch_id TEXT NOT NULL,"
+            " added REAL NOT NULL,"
+            " PRIMARY KEY (chain, tx_hash))"
+        )
+        migrations = (
+            # Databases created before reorg tracking have no block_hash column
+            "ALTER TABLE cursors ADD COLUMN block_hash TEXT",
+            # ... and ledgers created before relay retries keep no event payload or attempt count
+            "ALTER TABLE relay_events ADD COLUMN payload TEXT",
+            "ALTER TABLE relay_events ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0",
+        )
+        for migration in migrations:
+            try:
+                conn.execute(migration)
+            except sqlite3.OperationalError:
+                pass
+        conn.commit()
+        conns[db_path] = conn
+    return conn
+
+
+def get_cursor(chain, db_path=STATE_DB):
+    """
+        Returns the last block number scanned for chain,
+        or None if the chain has never been scanned
+    """
+    row = connect_state(db_path).execute(
+        "SELECT block FROM cursors WHERE chain = ?", (chain,)
+    ).fetchone()
+    return None if row is None else row[0]
+
+
+def get_cursor_hash(chain, db_path=STATE_DB):
+    """
+        Returns (block number, block hash) for the cursor of chain; the hash is None
+        unless it was recorded with set_cursor. Returns None if there is no cursor
+    """
+    row = connect_state(db_path).execute(
+        "SELECT block, block_hash FROM cursors WHERE chain = ?", (chain,)
+    ).fetchone()
+    return None if row is None else (row[0], row[1])
+
+
+def set_cursor(chain, block, db_path=STATE_DB, block_hash=None):
+    """
+        Records block (and optionally its hash, for reorg detection) as the last
+        block scanned for chain.
+        The write is committed before returning so a crash never loses it
+    """
+    conn = connect_state(db_path)
+    conn.execute(
+        "INSERT INTO cursors (chain, block, block_hash, updated) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(chain) DO UPDATE SET block = excluded.block, block_hash = excluded.block_hash, "
+        "updated = excluded.updated",
+        (chain, int(block), block_hash, time.time())
+    )
+    conn.commit()
+
+
+def event_key(event):
+    """
+        Returns the (tx_hash, log_index) pair identifying a decoded event log,
+        with tx_hash normalized to a lowercase 0x-prefixed hex string
+    """
+    tx_hash = event['transactionHash']
+    if not isinstance(tx_hash, str):
+        tx_hash = '0x' + bytes(tx_hash).hex()
+    elif not tx_hash.startswith('0x'):
+        tx_hash = '0x' + tx_hash
+    return tx_hash.lower(), int(event['logIndex'])
+
+
+def get_event_state(chain, tx_hash, log_index, db_path=STATE_DB):
+    """
+        Returns the ledger state of an event, or None if it has never been seen
+    """
+    row = connect_state(db_path).execute(
+        "SELECT state FROM relay_events WHERE chain = ? AND tx_hash = ? AND log_index = ?",
+        (chain, tx_hash, log_index)
+    ).fetchone()
+    return None if row is None else row[0]
+
+
+def claim_event(chain, tx_hash, log_index, db_path=STATE_DB, event=None):
+    """
+        Claims an event for relaying and returns True if the caller should relay it.
+        The claim is a single conditional upsert, so of several concurrent runs only
+        one wins. New events are claimed, as are failed events with relay attempts
+        left and claims older than CLAIM_TIMEOUT (whose run died before sending);
+        events claimed by someone else, submitted or confirmed return False.
+        event (the decoded log) is kept in the ledger so failed relays can be retried
+    """
+    now = time.time()
+    payload = None if event is None else json.dumps(_jsonable(dict(event)))
+    conn = connect_state(db_path)
+    with conn:
+        cur = conn.execute(
+            "INSERT INTO relay_events (chain, tx_hash, log_index, state, relay_tx, updated, payload, attempts) "
+            "VALUES (?, ?, ?, ?, NULL, ?, ?, 1) "
+            "ON CONFLICT(chain, tx_hash, log_index) DO UPDATE SET state = excluded.state, updated = excluded.updated, "
+            "payload = COALESCE(excluded.payload, relay_events.payload), attempts = relay_events.attempts + 1 "
+            "WHERE (relay_events.state = ? AND relay_events.attempts < ?) "
+            "OR (relay_events.state = ? AND relay_events.updated < ?)",
+            (chain, tx_hash, log_index, SEEN, now, payload,
+             FAILED, MAX_RELAY_ATTEMPTS, SEEN, now - CLAIM_TIMEOUT)
+        )
+    return cur.rowcount == 1
+
+
+def mark_event(chain, tx_hash, log_index, state, relay_tx=None, db_path=STATE_DB):
+    """
+        Moves an event to state, optionally recording the hash of the relay transaction
+    """
+    conn = connect_state(db_path)
+    with conn:
+        conn.execute(
+            "UPDATE relay_events SET state = ?, relay_tx = COALESCE(?, relay_tx), updated = ? "
+            "WHERE chain = ? AND tx_hash = ? AND log_index = ?",
+            (state, relay_tx, time.time(), chain, tx_hash, log_index)
+        )
+
+
+def failed_events(chain, db_path=STATE_DB, retry_delay=RETRY_DELAY):
+    """
+        Returns the decoded events of chain that claim_event() would hand out again,
+        oldest first: relays that failed at least retry_delay seconds ago and have
+        attempts left, and claims older than CLAIM_TIMEOUT whose run died before
+        recording a relay (their events were unstaged by whichever run skipped them)
+    """
+    now = time.time()
+    rows = connect_state(db_path).execute(
+        "SELECT payload FROM relay_events WHERE chain = ? AND payload IS NOT NULL "
+        "AND ((state = ? AND attempts < ? AND updated < ?) OR (state = ? AND updated < ?)) "
+        "ORDER BY updated",
+        (chain, FAILED, MAX_RELAY_ATTEMPTS, now - retry_delay, SEEN, now - CLAIM_TIMEOUT)
+    ).fetchall()
+    return [json.loads(row[0]) for row in rows]
+
+
+def _jsonable(value):
+    if isinstance(value, (bytes, bytearray)):
+        return '0x' + bytes(value).hex()
+    if isinstance(value, Mapping):
+        return {k: _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    return value
+
+
+def stage_events(chain, events, db_path=STATE_DB):
+    """
+        Holds decoded events until their blocks are deep enough to be final.
+        Each event is stored with its block hash so reorged blocks can be detected
+    """
+    rows = []
+    for event in events:
+        payload = _jsonable(dict(event))
+        tx_hash, log_index = event_key(payload)
+        rows.append((chain, payload['blockNumber'], payload['blockHash'].lower(), tx_hash, log_index, json.dumps(payload)))
+
+    conn = connect_state(db_path)
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO staged_events (chain, block_number, block_hash, tx_hash, log_index, payload) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows
+        )
+
+
+def staged_blocks(chain, db_path=STATE_DB):
+    """Returns {block number: block hash} for every block with staged events on chain"""
+    rows = connect_state(db_path).execute(
+        "SELECT DISTINCT block_number, block_hash FROM staged_events WHERE chain = ?", (chain,)
+    ).fetchall()
+    return dict(rows)
+
+
+def confirmed_events(chain, upto_block, db_path=STATE_DB):
+    """Returns the staged events of chain in blocks up to upto_block, in (block, logIndex) order"""
+    rows = connect_state(db_path).execute(
+        "SELECT payload FROM staged_events WHERE chain = ? AND block_number <= ? "
+        "ORDER BY block_number, log_index",
+        (chain, upto_block)
+    ).fetchall()
+    return [json.loads(row[0]) for row in rows]
+
+
+def unstage_event(chain, tx_hash, log_index, db_path=STATE_DB):
+    """Removes an event that has been released to its handler"""
+    conn = connect_state(db_path)
+    with conn:
+        conn.execute(
+            "DELETE FROM staged_events WHERE chain = ? AND tx_hash = ? AND log_index = ?",
+            (chain, tx_hash, log_index)
+        )
+
+
+def drop_staged_from(chain, block_number, db_path=STATE_DB):
+    """
+        Discards staged events and recorded block hashes of chain in blocks
+        block_number and above (after a reorg). Returns the number of events dropped
+    """
+    conn = connect_state(db_path)
+    with conn:
+        cur = conn.execute(
+            "DELETE FROM staged_events WHERE chain = ? AND block_number >= ?",
+            (chain, block_number)
+        )
+        conn.execute(
+            "DELETE FROM block_hashes WHERE chain = ? AND block_number >= ?",
+            (chain, block_number)
+        )
+    return cur.rowcount
+
+
+def record_block_hashes(chain, hashes, keep_from, db_path=STATE_DB):
+    """
+        Records {block number: block hash} for recently scanned blocks of chain,
+        so reorgs are detected even in blocks without events, and forgets the
+        hashes of blocks below keep_from
+    """
+    conn = connect_state(db_path)
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO block_hashes (chain, block_number, block_hash) VALUES (?, ?, ?)",
+            [(chain, int(n), h.lower()) for n, h in hashes.items()]
+        )
+        conn.execute(
+            "DELETE FROM block_hashes WHERE chain = ? AND block_number < ?", (chain, keep_from)
+        )
+
+
+def recorded_block_hashes(chain, db_path=STATE_DB):
+    """Returns {block number: block hash} for the recently scanned blocks of chain"""
+    rows = connect_state(db_path).execute(
+        "SELECT block_number, block_hash FROM block_hashes WHERE chain = ?", (chain,)
+    ).fetchall()
+    return dict(rows)
+
+
+def relayed_events(chain, relay_txs, db_path=STATE_DB):
+    """Returns the (tx_hash, log_index) of submitted events of chain whose relay is one of relay_txs"""
+    relay_txs = list(relay_txs)
+    if not relay_txs:
+        return []
+    placeholders = ', '.join('?' for _ in relay_txs)
+    rows = connect_state(db_path).execute(
+        f"SELECT tx_hash, log_index FROM relay_events WHERE chain = ? AND state = ? AND relay_tx IN ({placeholders})",
+        (chain, SUBMITTED, *relay_txs)
+    ).fetchall()
+    return [(row[0], row[1]) for row in rows]
+
+
+def submitted_relays(chain, db_path=STATE_DB):
+    """Returns {relay tx hash: [(tx_hash, log_index)]} for the submitted events of chain"""
+    rows = connect_state(db_path).execute(
+        "SELECT relay_tx, tx_hash, log_index FROM relay_events WHERE chain = ? AND state = ? AND relay_tx IS NOT NULL",
+        (chain, SUBMITTED)
+    ).fetchall()
+    relays = {}
+    for relay_tx, tx_hash, log_index in rows:
+        relays.setdefault(relay_tx, []).append((tx_hash, log_index))
+    return relays
+
+
+def track_receipts(chain, watch_id, tx_hashes, db_path=STATE_DB):
+    """
+        Records tx_hashes (a transaction and its replacements, grouped under watch_id)
+        as awaiting a receipt on chain, so tracking survives a restart
+    """
+    now = time.time()
+    conn = connect_state(db_path)
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO tracked_receipts (chain, tx_hash, watch_id, added) VALUES (?, ?, ?, ?)",
+            [(chain, tx_hash, watch_id, now) for tx_hash in tx_hashes]
+        )
+
+
+def tracked_receipts(chain, db_path=STATE_DB):
+    """Returns {watch_id: (tx hashes, time first tracked)} for every transaction still awaiting a receipt on chain"""
+    rows = connect_state(db_path).execute(
+        "SELECT watch_id, tx_hash, added FROM tracked_receipts WHERE chain = ? ORDER BY added, rowid", (chain,)
+    ).fetchall()
+    watches = {}
+    for watch_id, tx_hash, added in rows:
+        hashes, first = watches.get(watch_id, ([], added))
+        hashes.append(tx_hash)
+        watches[watch_id] = (hashes, min(first, added))
+    return watches
+
+
+def untrack_receipts(chain, watch_id, db_path=STATE_DB):
+    """Forgets a tracked transaction once its receipt has been found"""
+    conn = connect_state(db_path)
+    with conn:
+        conn.execute(
+            "DELETE FROM tracked_receipts WHERE chain = ? AND watch_id = ?", (chain, watch_id)
+        )
@@ -0,0 +1,120 @@
+import json
+import os
+import threading
+from dataclasses import dataclass
+from functools import cached_property
+from eth_account import Account
+from eth_utils import event_abi_to_log_topic
+from web3 import Web3
+
+from connections import RPC_URLS, resolve_chain
+
+CONTRACT_INFO = "contract_info.json"
+
+_lock = threading.Lock()
+_cache = {}  # absolute path -> (mtime, BridgeConfig)
+
+
+@dataclass(frozen=True)
+class ChainConfig:
+    """
+        Deployment details for one chain in contract_info.json. It can also be read
+        like the chain's raw JSON entry (config['address'], config.get('abi')),
+        as get_contract_info() used to return
+    """
+    name: str
+    rpc_urls: tuple
+    address: str
+    abi: list
+    event_topics: dict  # event name -> 0x-prefixed topic0 hash
+    entry: dict  # the chain's entry in contract_info.json, as parsed
+
+    @property
+    def rpc_url(self):
+        """The primary endpoint"""
+        return self.rpc_urls[0] if self.rpc_urls else None
+
+    def __getitem__(self, key):
+        return self.entry[key]
+
+    def __contains__(self, key):
+        return key in self.entry
+
+    def get(self, key, default=None):
+        return self.entry.get(key, default)
+
+    def keys(self):
+        return self.entry.keys()
+
+
+@dataclass(frozen=True)
+class BridgeConfig:
+    """Everything in contract_info.json, parsed once"""
+    path: str
+    warden_key: str
+    chains: dict  # chain name -> ChainConfig
+
+    def chain(self, name):
+        """Returns the ChainConfig for name, raising KeyError if it is not configured"""
+        return self.chains[name]
+
+    @cached_property
+    def warden_account(self):
+        """The warden's LocalAccount, or None if no key is configured"""
+        if not self.warden_key:
+            return None
+        return Account.from_key(self.warden_key)
+
+
+def _parse(path, data):
+    chains = {}
+    for name, entry in data.items():
+        if not isinstance(entry, dict) or 'address' not in entry or 'abi' not in entry:
+            continue
+        try:
+            rpc_urls = tuple(RPC_URLS[resolve_chain(name)])
+        except ValueError:
+            rpc_urls = ()
+        topics = {
+            item['name']: '0x' + event_abi_to_log_topic(item).hex()
+            for item in entry['abi'] if item.get('type') == 'event'
+        }
+        chains[name] = ChainConfig(
+            name=name,
+            rpc_urls=rpc_urls,
+            address=Web3.to_checksum_address(entry['address']),
+            abi=entry['abi'],
+            event_topics=topics,
+            entry=entry,
+        )
+
+    warden_key = data.get('warden_key')
+    if warden_key and not warden_key.startswith('0x'):
+        warden_key = '0x' + warden_key
+
+    return BridgeConfig(path=path, warden_key=warden_key, chains=chains)
+
+
+def load_config(path=CONTRACT_INFO, check_mtime=True):
+    """
+        Returns the BridgeConfig for the contract info file at path.
+        The file is parsed once; with check_mtime it is re-read only when its
+        modification time changes, otherwise the first parse is kept for good
+    """
+    path = os.path.abspath(path)
+    cached = _cache.get(path)
+    if cached is not None and not check_mtime:
+        return cached[1]
+
+    mtime = os.stat(path).st_mtime_ns
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with _lock:
+        cached = _cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with open(path, 'r') as f:
+            config = _parse(path, json.load(f))
+        _cache[path] = (mtime, config)
+    return config
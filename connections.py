@@ -0,0 +1,190 @@
+import contextlib
+import hashlib
+import json
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import Web3
+from web3.middleware import ExtraDataToPOAMiddleware  # Necessary for POA chains
+
+from rpc_pool import PooledProvider
+
+# Endpoints per chain, primary first. Chains with several endpoints get a PooledProvider
+# that routes to the fastest healthy one and fails over on throttling or errors
+RPC_URLS = {
+    'avax': [  # AVAX C-chain testnet
+        "https://api.avax-test.network/ext/bc/C/rpc",
+        "https://avalanche-fuji-c-chain-rpc.publicnode.com",
+    ],
+    'bsc': [  # BSC testnet
+        "https://data-seed-prebsc-1-s1.binance.org:8545/",
+        "https://data-seed-prebsc-2-s1.binance.org:8545/",
+        "https://bsc-testnet-rpc.publicnode.com",
+    ],
+    'eth': [  # Ethereum mainnet
+        "https://mainnet.infura.io/v3/def845368e8e47529180a15c63d275dc",
+        "https://ethereum-rpc.publicnode.com",
+    ],
+}
+
+# The bridge refers to its chains by role
+CHAIN_ALIASES = {
+    'source': 'avax',
+    'destination': 'bsc',
+}
+
+POA_CHAINS = {'avax', 'bsc'}
+
+POOL_SIZE = 16  # keep-alive connections held open per endpoint
+
+_lock = threading.Lock()
+_connections = {}  # chain -> Web3
+_contracts = {}  # (chain, address, abi fingerprint) -> contract
+_fingerprints = {}  # id(abi) -> (abi, fingerprint); holding the abi keeps its id from being reused
+_stats = {}  # endpoint url -> EndpointStats
+
+
+class EndpointStats:
+    """Request counters for one RPC endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds, error=False):
+        with self._lock:
+            self.requests += 1
+            self.errors += int(error)
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'errors': self.errors,
+                'avg_ms': 1000 * self.total_seconds / self.requests if self.requests else 0.0,
+                'max_ms': 1000 * self.max_seconds,
+            }
+
+
+class StatsSession(requests.Session):
+    """A pooled keep-alive session that records the latency of every request it makes"""
+
+    def __init__(self, stats, pool_size=POOL_SIZE):
+        super().__init__()
+        self.stats = stats
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+
+    def request(self, method, url, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except Exception:
+            self.stats.record(time.perf_counter() - start, error=True)
+            raise
+        self.stats.record(time.perf_counter() - start, error=response.status_code >= 400)
+        return response
+
+
+def resolve_chain(chain):
+    """Returns the canonical chain name for chain ('source' -> 'avax', etc.)"""
+    chain = CHAIN_ALIASES.get(chain, chain)
+    if chain not in RPC_URLS:
+        raise ValueError(f"{chain} is not a known chain")
+    return chain
+
+
+def _session(url):
+    """A keep-alive session for url whose requests are counted in get_stats()"""
+    return StatsSession(_stats.setdefault(url, EndpointStats()))
+
+
+def get_web3(chain):
+    """
+        Returns the shared web3 instance for chain, creating it on first use.
+        Every instance reuses one pooled HTTP session per endpoint, and chains with
+        several endpoints are load balanced and failed over by a PooledProvider
+    """
+    chain = resolve_chain(chain)
+    w3 = _connections.get(chain)
+    if w3 is not None:
+        return w3
+
+    with _lock:
+        w3 = _connections.get(chain)
+        if w3 is None:
+            urls = RPC_URLS[chain]
+            if len(urls) == 1:
+                provider = Web3.HTTPProvider(urls[0], session=_session(urls[0]))
+            else:
+                provider = PooledProvider(urls, session_factory=_session)
+            w3 = Web3(provider)
+            if chain in POA_CHAINS:
+                # inject the poa compatibility middleware to the innermost layer
+                w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
+            _connections[chain] = w3
+    return w3
+
+
+def pinned(w3, endpoint=None):
+    """
+        Context manager sending every request the calling thread makes through w3 to
+        a single endpoint while it is held, so a block range read from one node is
+        never combined with another node's head. Worker threads share a pin by
+        passing the endpoint it yielded. A no-op for single-endpoint connections
+    """
+    if isinstance(w3.provider, PooledProvider):
+        return w3.provider.pinned(endpoint)
+    return contextlib.nullcontext()
+
+
+def abi_fingerprint(abi):
+    """
+        A hash of the full canonical JSON of an ABI, used to key the contract cache.
+        It is computed once per ABI object (ABIs are treated as immutable), so
+        callers passing the same parsed ABI each time skip the serialization
+    """
+    cached = _fingerprints.get(id(abi))
+    if cached is not None and cached[0] is abi:
+        return cached[1]
+    fingerprint = hashlib.sha256(json.dumps(abi, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+    with _lock:
+        _fingerprints[id(abi)] = (abi, fingerprint)
+    return fingerprint
+
+
+def get_contract(chain, address, abi):
+    """
+        Returns a cached contract object for address on chain with the given ABI,
+        so repeated calls skip re-parsing the ABI
+    """
+    chain = resolve_chain(chain)
+    address = Web3.to_checksum_address(address)
+    key = (chain, address, abi_fingerprint(abi))
+    contract = _contracts.get(key)
+    if contract is None:
+        contract = get_web3(chain).eth.contract(address=address, abi=abi)
+        with _lock:
+            contract = _contracts.setdefault(key, contract)
+    return contract
+
+
+def get_stats():
+    """
+        Returns {endpoint url: request counters} for every endpoint used so far,
+        including the pool's rolling latency and health for pooled endpoints
+    """
+    with _lock:
+        stats = {url: s.snapshot() for url, s in _stats.items()}
+        for w3 in _connections.values():
+            if isinstance(w3.provider, PooledProvider):
+                for url, health in w3.provider.health().items():
+                    stats.setdefault(url, {}).update(health)
+    return stats
@@ -0,0 +1,237 @@
+import csv
+import os
+import sqlite3
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime
+from pathlib import Path
+
+DEPOSIT_FIELDS = ['chain', 'token', 'recipient', 'amount', 'transactionHash', 'address', 'date',
+                  'blockNumber', 'logIndex', 'timestamp']
+
+# uint256 values do not fit in any native integer column, so binary sinks store them
+# as 32-byte big-endian strings (which also sort in numeric order); CSV keeps full decimal text
+UINT256_FIELDS = {'amount'}
+INT_FIELDS = {'blockNumber', 'logIndex', 'timestamp'}
+
+BATCH_SIZE = 1000
+
+
+def encode_uint256(value):
+    return int(value).to_bytes(32, 'big')
+
+
+def decode_uint256(value):
+    return int.from_bytes(value, 'big')
+
+
+class EventSink(ABC):
+    """
+        Base class for streaming event writers. Rows are buffered and written in
+        batches of batch_size, so memory use stays constant however many events
+        are recorded
+    """
+
+    def __init__(self, path, fields=DEPOSIT_FIELDS, batch_size=BATCH_SIZE):
+        self.path = Path(path)
+        self.fields = list(fields)
+        self.batch_size = batch_size
+        self.buffer = []
+        self.count = 0
+
+    def write(self, row):
+        self.buffer.append(row)
+        self.count += 1
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.write_batch(self.buffer)
+            self.buffer = []
+
+    def close(self):
+        self.flush()
+
+    def abort(self):
+        """Called instead of close() when the writing failed; by default the rows so far are kept"""
+        self.close()
+
+    @abstractmethod
+    def write_batch(self, rows):
+        """Writes a list of row dicts to the output"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class CsvSink(EventSink):
+    """
+        Appends rows to a CSV file, writing the header when the file is new.
+        A file whose header lacks some of fields (written before those columns
+        existed) is first rewritten with the missing columns added, left empty
+    """
+
+    def __init__(self, path, fields=DEPOSIT_FIELDS, batch_size=BATCH_SIZE):
+        super().__init__(path, fields, batch_size)
+        new_file = not self.path.exists() or self.path.stat().st_size == 0
+        if not new_file:
+            with open(self.path, newline='') as f:
+                header = next(csv.reader(f), [])
+            missing = [field for field in self.fields if field not in header]
+            if missing:
+                self.migrate(header + missing)
+            # Keep the file's column order; its columns are a superset of fields now
+            self.fields = header + missing
+        self.file = open(self.path, 'a', newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=self.fields, extrasaction='ignore')
+        if new_file:
+            self.writer.writeheader()
+
+    def migrate(self, header):
+        """Rewrites the file with header, streaming the existing rows across"""
+        migrated = self.path.with_name(self.path.name + '.migrating')
+        with open(self.path, newline='') as src, open(migrated, 'w', newline='') as dst:
+            writer = csv.DictWriter(dst, fieldnames=header)
+            writer.writeheader()
+            writer.writerows(csv.DictReader(src))
+        os.replace(migrated, self.path)
+
+    def write_batch(self, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+
+class SqliteSink(EventSink):
+    """
+        Inserts rows into a SQLite table that can be queried without re-reading the file.
+        An existing table missing some of fields is migrated with ALTER TABLE ADD COLUMN
+    """
+
+    def __init__(self, path, fields=DEPOSIT_FIELDS, batch_size=BATCH_SIZE, table='deposits'):
+        super().__init__(path, fields, batch_size)
+        self.table = table
+        self.conn = sqlite3.connect(str(self.path))
+        columns = ', '.join(f'"{f}" {self.column_type(f)}' for f in self.fields)
+        self.conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" ({columns})')
+        # Tables created before some of fields existed get the missing columns (NULL in old rows)
+        existing = set(row[1] for row in self.conn.execute(f'PRAGMA table_info("{table}")'))
+        for f in self.fields:
+            if f not in existing:
+                self.conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "{f}" {self.column_type(f)}')
+        if 'transactionHash' in self.fields:
+            self.conn.execute(f'CREATE INDEX IF NOT EXISTS "{table}_tx" ON "{table}" ("transactionHash")')
+        self.conn.commit()
+        placeholders = ', '.join('?' for _ in self.fields)
+        names = ', '.join(f'"{f}"' for f in self.fields)
+        self.insert = f'INSERT INTO "{table}" ({names}) VALUES ({placeholders})'
+
+    @staticmethod
+    def column_type(field):
+        if field in UINT256_FIELDS:
+            return 'BLOB'
+        if field in INT_FIELDS:
+            return 'INTEGER'
+        return 'TEXT'
+
+    def encode(self, row):
+        return tuple(
+            encode_uint256(row[f]) if f in UINT256_FIELDS else row.get(f)
+            for f in self.fields
+        )
+
+    def write_batch(self, rows):
+        with self.conn:
+            self.conn.executemany(self.insert, [self.encode(row) for row in rows])
+
+    def close(self):
+        super().close()
+        self.conn.close()
+
+
+class ParquetSink(EventSink):
+    """
+        Writes rows to a Parquet dataset directory, one row group per batch (requires
+        pyarrow). Parquet files cannot be appended to, so each sink writes a new part
+        file in the directory and earlier runs are kept; pyarrow reads the directory
+        as one table. The part is written under a hidden name and only renamed into
+        place on close; a run that fails (or crashes) discards it, so the dataset
+        never holds a partial part
+    """
+
+    def __init__(self, path, fields=DEPOSIT_FIELDS, batch_size=BATCH_SIZE):
+        super().__init__(path, fields, batch_size)
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("ParquetSink requires pyarrow (pip install pyarrow)")
+        self.pa = pa
+        self.schema = pa.schema([(f, self.column_type(pa, f)) for f in self.fields])
+
+        if self.path.is_file():
+            # A single file written before sinks produced datasets becomes the first part
+            legacy = self.path.with_name(self.path.name + '.legacy')
+            self.path.rename(legacy)
+            self.path.mkdir()
+            legacy.rename(self.path / 'part-legacy.parquet')
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        name = f"part-{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.parquet"
+        self.part = self.path / name
+        # pyarrow skips files starting with '.' when reading a dataset
+        self.pending = self.path / f".{name}.tmp"
+        self.writer = pq.ParquetWriter(str(self.pending), self.schema)
+
+    @staticmethod
+    def column_type(pa, field):
+        if field in UINT256_FIELDS:
+            return pa.binary(32)
+        if field in INT_FIELDS:
+            return pa.int64()
+        return pa.string()
+
+    def write_batch(self, rows):
+        columns = {}
+        for f in self.fields:
+            if f in UINT256_FIELDS:
+                columns[f] = [encode_uint256(row[f]) for row in rows]
+            else:
+                columns[f] = [row.get(f) for row in rows]
+        self.writer.write_table(self.pa.Table.from_pydict(columns, schema=self.schema))
+
+    def close(self):
+        super().close()
+        self.writer.close()
+        os.replace(self.pending, self.part)
+
+    def abort(self):
+        self.buffer = []
+        self.writer.close()
+        self.pending.unlink(missing_ok=True)
+
+
+SINKS = {
+    '.csv': CsvSink,
+    '.db': SqliteSink,
+    '.sqlite': SqliteSink,
+    '.parquet': ParquetSink,
+}
+
+
+def open_sink(path, fields=DEPOSIT_FIELDS, batch_size=BATCH_SIZE):
+    """Returns the sink matching the extension of path (.csv, .db/.sqlite or .parquet)"""
+    suffix = Path(path).suffix.lower()
+    if suffix not in SINKS:
+        raise ValueError(f"No event sink for '{suffix}' files (use one of {', '.join(SINKS)})")
+    return SINKS[suffix](path, fields, batch_size)
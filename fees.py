@@ -0,0 +1,170 @@
+import threading
+import time
+from statistics import median
+
+from connections import get_web3, resolve_chain
+from rpc_batch import RPCError, batch_request, encode_call
+
+GAS_TTL = 600  # seconds a cached gas estimate is reused before it is refreshed
+FEE_TTL = 3  # seconds fee data is reused (about one block on the bridge chains)
+FEE_HISTORY_BLOCKS = 10  # recent blocks the priority fee suggestion is taken from
+PRIORITY_PERCENTILE = 50
+
+# Estimates depend on storage state (a first mint to a new recipient costs more than
+# later ones), so cached estimates get a proportional margin plus a flat buffer
+GAS_MARGIN_NUMERATOR = 6
+GAS_MARGIN_DENOMINATOR = 5
+GAS_BUFFER = 10000
+
+_oracles = {}
+_oracles_lock = threading.Lock()
+
+
+def gas_key(fn_name, args):
+    """
+        The part of a call its gas cost depends on: the function and the token
+        (the first argument), or for array arguments (batch relays, Merkle proofs)
+        the set of tokens in the array and its length
+    """
+    token = args[0] if args else None
+    if isinstance(token, (list, tuple)):
+        return fn_name, frozenset(t for t in token if isinstance(t, str)), len(token)
+    return fn_name, token if isinstance(token, str) else None
+
+
+class FeeOracle:
+    """
+        Gas limits and fees for transactions on one chain without per-transaction
+        round-trips. Gas estimates are cached per (contract, function, token) for
+        GAS_TTL seconds, and fees are refreshed from eth_feeHistory at most every
+        FEE_TTL seconds: EIP-1559 fields where the chain has a base fee, otherwise
+        (e.g. on BSC, whose base fee is zero, or on nodes without eth_feeHistory,
+        which is remembered) a legacy gasPrice.
+        Whatever is missing is fetched in a single JSON-RPC batch
+    """
+
+    def __init__(self, w3, gas_ttl=GAS_TTL, fee_ttl=FEE_TTL):
+        self.w3 = w3
+        self.gas_ttl = gas_ttl
+        self.fee_ttl = fee_ttl
+        self.chain_id = None
+        self.estimates = {}  # (contract address, gas_key) -> (gas, fetched)
+        self.fee_data = None
+        self.fee_fetched = 0.0
+        self.fee_history = True  # cleared once the node turns out not to support eth_feeHistory
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def cached_gas(self, key):
+        with self._lock:
+            entry = self.estimates.get(key)
+        if entry is None or time.monotonic() - entry[1] > self.gas_ttl:
+            return None
+        return entry[0]
+
+    def fees_stale(self):
+        return self.fee_data is None or time.monotonic() - self.fee_fetched > self.fee_ttl
+
+    @staticmethod
+    def parse_fees(history, gas_price):
+        """Fee fields from an eth_feeHistory result (None if unsupported) and eth_gasPrice"""
+        base_fees = history.get('baseFeePerGas') if history else None
+        next_base_fee = int(base_fees[-1], 16) if base_fees else 0
+        if next_base_fee == 0:
+            return {'gasPrice': gas_price}
+
+        rewards = [int(r[0], 16) for r in history.get('reward') or [] if r]
+        priority = int(median(rewards)) if rewards else max(0, gas_price - next_base_fee)
+        # Twice the next base fee keeps the transaction valid through several full blocks
+        return {
+            'maxFeePerGas': 2 * next_base_fee + priority,
+            'maxPriorityFeePerGas': priority,
+        }
+
+    def refresh(self, estimate=None):
+        """
+            Fetch stale fee data, the chain id if unknown and, if estimate is given
+            as (key, tx dict), a gas estimate, all in one batch. Returns the estimate
+        """
+        calls = []
+        if self.chain_id is None:
+            calls.append(('eth_chainId', []))
+        if self.fees_stale():
+            calls.append(('eth_gasPrice', []))
+            if self.fee_history:
+                calls.append(('eth_feeHistory', [hex(FEE_HISTORY_BLOCKS), 'latest', [PRIORITY_PERCENTILE]]))
+        if estimate is not None:
+            calls.append(('eth_estimateGas', [estimate[1]]))
+        if not calls:
+            return None
+
+        try:
+            results = dict(zip((method for method, _ in calls), batch_request(self.w3, calls)))
+        except RPCError:
+            if not any(method == 'eth_feeHistory' for method, _ in calls):
+                raise
+            # Node without eth_feeHistory; fall back to legacy pricing
+            calls = [r for r in calls if r[0] != 'eth_feeHistory']
+            results = dict(zip((method for method, _ in calls), batch_request(self.w3, calls)))
+            # The rest succeeded, so eth_feeHistory was the failing call; stop asking for it
+            self.fee_history = False
+
+        with self._lock:
+            if 'eth_chainId' in results:
+                self.chain_id = int(results['eth_chainId'], 16)
+            if 'eth_gasPrice' in results:
+                self.fee_data = self.parse_fees(results.get('eth_feeHistory'), int(results['eth_gasPrice'], 16))
+                self.fee_fetched = time.monotonic()
+            if estimate is None:
+                return None
+            gas = int(results['eth_estimateGas'], 16)
+            self.estimates[estimate[0]] = (gas, time.monotonic())
+            return gas
+
+    def fees(self):
+        """Returns the current fee fields ({'gasPrice'} or {'maxFeePerGas', 'maxPriorityFeePerGas'})"""
+        if self.fees_stale() or self.chain_id is None:
+            self.refresh()
+        return dict(self.fee_data)
+
+    def transaction_params(self, contract, fn_name, args, sender):
+        """
+            Returns the gas limit, fee fields and chain id for sender calling
+            contract.fn_name(*args), ready to pass to build_transaction
+        """
+        key = (contract.address, gas_key(fn_name, args))
+        gas = self.cached_gas(key)
+        if gas is None:
+            self.misses += 1
+            gas = self.refresh((key, {
+                'from': sender,
+                'to': contract.address,
+                'data': encode_call(contract, fn_name, args)
+            }))
+        else:
+            self.hits += 1
+            if self.fees_stale() or self.chain_id is None:
+                self.refresh()
+
+        params = {
+            'gas': gas * GAS_MARGIN_NUMERATOR // GAS_MARGIN_DENOMINATOR + GAS_BUFFER,
+            'chainId': self.chain_id,
+        }
+        params.update(self.fee_data)
+        return params
+
+
+def get_fee_oracle(chain):
+    """Returns the shared FeeOracle for chain"""
+    chain = resolve_chain(chain)
+    with _oracles_lock:
+        oracle = _oracles.get(chain)
+        if oracle is None:
+            oracle = _oracles[chain] = FeeOracle(get_web3(chain))
+    return oracle
+
+
+def transaction_params(chain, contract, fn_name, args, sender):
+    """Gas limit, fees and chain id for sender calling contract.fn_name(*args) on chain"""
+    return get_fee_oracle(chain).transaction_params(contract, fn_name, list(args), sender)
@@ -1,10 +1,15 @@
 #!/bin/python
 import hashlib
+import itertools
+import multiprocessing
 import os
 import random
+import time
 
+MINE_CHUNK = 20000  # nonces a parallel worker tries between checks for cancellation
 
-def mine_block(k, prev_hash, transactions):
+
+def mine_block(k, prev_hash, transactions, workers=1, smallest=True):
     """
         k - Number of trailing zeros in the binary representation (integer)
         prev_hash - the hash of the previous block (bytes)
@@ -13,38 +18,147 @@ def mine_block(k, prev_hash, transactions):
         Complete this function to find a nonce such that 
         sha256( prev_hash + rand_lines + nonce )
         has k trailing zeros in its *binary* representation
+
+        workers - processes to search with (None for one per core); see mine_block_parallel
     """
     if not isinstance(k, int) or k < 0:
         print("mine_block expects positive integer")
         return b'\x00'
 
-    base_data = prev_hash
-    for transaction in transactions:
-        base_data += transaction.encode('utf-8')
-    
-    nonce_counter = 0
-    while True:
-        nonce = str(nonce_counter).encode('utf-8')
-        hash_input = base_data + nonce
-        hash_result = hashlib.sha256(hash_input).hexdigest()
-        hash_binary = bin(int(hash_result, 16))[2:]
-        hash_binary = hash_binary.zfill(256)
-        trailing_zeros = 0
-        for i in range(len(hash_binary) - 1, -1, -1):
-            if hash_binary[i] == '0':
-                trailing_zeros += 1
-            else:
-                break
-        if trailing_zeros >= k:
-            assert isinstance(nonce, bytes), 'nonce should be of type bytes'
-            return nonce
-        
-        nonce_counter += 1
+    if workers != 1:
+        nonce, _ = mine_block_parallel(k, prev_hash, transactions, workers, smallest)
+    else:
+        nonce = search_nonces(block_state(prev_hash, transactions), k)
 
     assert isinstance(nonce, bytes), 'nonce should be of type bytes'
     return nonce
 
 
+def block_state(prev_hash, transactions):
+    """
+        Returns a sha256 object that has already absorbed prev_hash and the transactions,
+        so each nonce only costs a copy of the state and one update
+    """
+    state = hashlib.sha256(prev_hash)
+    for transaction in transactions:
+        state.update(transaction.encode('utf-8'))
+    return state
+
+
+def search_nonces(state, k, start=0, step=1, stop=None):
+    """
+        Tries the nonces str(start), str(start + step), ... (below stop, if given) and
+        returns the first (as bytes) whose sha256, continuing from state, has k trailing
+        zero bits. Returns None if stop is reached without finding one
+    """
+    # The trailing bits of the hash are the low bits of its last bytes (big-endian).
+    # Checking the last byte alone first rejects almost every hash without building an int
+    mask = (1 << k) - 1
+    last_byte_mask = mask & 0xff
+    tail = -max(1, (k + 7) // 8)
+    copy = state.copy
+    from_bytes = int.from_bytes
+
+    counters = itertools.count(start, step) if stop is None else range(start, stop, step)
+    for counter in counters:
+        nonce = b'%d' % counter
+        h = copy()
+        h.update(nonce)
+        digest = h.digest()
+        if digest[-1] & last_byte_mask:
+            continue
+        if not from_bytes(digest[tail:], 'big') & mask:
+            return nonce
+    return None
+
+
+def _mine_worker(k, prev_hash, transactions, start, step, smallest, best, hashes):
+    """
+        Searches the nonces start, start + step, ... in chunks of MINE_CHUNK, checking
+        between chunks whether another worker has already finished the search
+    """
+    state = block_state(prev_hash, transactions)
+    chunk_start = start
+    tried = 0
+    while True:
+        found = best.value
+        # Past the best nonce found so far, nothing this worker finds can be smaller
+        if found >= 0 and (not smallest or chunk_start > found):
+            break
+        chunk_stop = chunk_start + MINE_CHUNK * step
+        nonce = search_nonces(state, k, chunk_start, step, chunk_stop)
+        if nonce is None:
+            tried += MINE_CHUNK
+            chunk_start = chunk_stop
+            continue
+
+        counter = int(nonce)
+        tried += (counter - chunk_start) // step + 1
+        with best.get_lock():
+            if best.value < 0 or counter < best.value:
+                best.value = counter
+        break
+
+    with hashes.get_lock():
+        hashes.value += tried
+
+
+def mine_block_parallel(k, prev_hash, transactions, workers=None, smallest=True):
+    """
+        Mines a block on several processes. Worker i of n tries the nonces i, i + n,
+        i + 2n, ..., so together they cover the same nonces as mine_block without
+        overlap. With smallest, workers keep going until no smaller nonce can turn up,
+        so the result is the nonce mine_block returns; otherwise every worker stops
+        as soon as any of them finds a valid nonce.
+        Returns (nonce, number of hashes computed)
+    """
+    workers = workers or os.cpu_count() or 1
+    context = multiprocessing.get_context()
+    best = context.Value('q', -1)
+    hashes = context.Value('q', 0)
+    processes = [
+        context.Process(
+            target=_mine_worker,
+            args=(k, prev_hash, transactions, i, workers, smallest, best, hashes),
+            daemon=True
+        )
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    if best.value < 0:
+        raise RuntimeError("Mining workers exited without finding a nonce")
+    return b'%d' % best.value, hashes.value
+
+
+def mining_stats(k, prev_hash, transactions, workers=1, smallest=True):
+    """
+        Mines a block like mine_block and returns the nonce together with the
+        number of hashes computed, the time taken and the hash rate.
+        Returns None if k is not a non-negative integer
+    """
+    if not isinstance(k, int) or k < 0:
+        print("mining_stats expects positive integer")
+        return None
+
+    start = time.perf_counter()
+    if workers == 1:
+        nonce = mine_block(k, prev_hash, transactions)
+        hashes = int(nonce) + 1  # nonces are tried in order from 0
+    else:
+        nonce, hashes = mine_block_parallel(k, prev_hash, transactions, workers, smallest)
+    seconds = time.perf_counter() - start
+    return {
+        'nonce': nonce,
+        'hashes': hashes,
+        'seconds': seconds,
+        'hashes_per_second': hashes / seconds if seconds > 0 else float('inf'),
+    }
+
+
 def get_random_lines(filename, quantity):
     """
     This is a helper function to get the quantity of lines ("transactions")
@@ -73,5 +187,7 @@ if __name__ == '__main__':
     diff = 20
 
     transactions = get_random_lines(filename, num_lines)
-    nonce = mine_block(diff, transactions)
-    print(nonce)
+    prev_hash = os.urandom(32)
+    stats = mining_stats(diff, prev_hash, transactions, workers=os.cpu_count())
+    print(stats['nonce'])
+    print(f"{stats['hashes']} hashes in {stats['seconds']:.2f}s ({stats['hashes_per_second']:,.0f} hashes/s)")
@@ -0,0 +1,241 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+DEFAULT_WINDOW = 2000  # blocks requested per eth_getLogs call to start with
+MIN_WINDOW = 1
+MAX_WINDOW = 50000
+CEILING_RESET = 16  # successful calls before probing above a window that failed
+THROTTLE_RETRIES = 5  # retries of a throttled request before giving up
+THROTTLE_BACKOFF = 0.5  # base delay for exponential backoff between those retries
+
+# Backfill defaults
+DEFAULT_WORKERS = 8
+DEFAULT_PARTITION = 20000  # blocks handed to one worker at a time
+DEFAULT_RATE = 20  # requests per second across all workers (public testnet RPCs throttle hard)
+
+# Fragments of the errors providers return when a getLogs request covers too many
+# blocks or matches too many results (geth, erigon, infura, alchemy, bsc/avax nodes).
+# They must not match throttling, which a smaller window does not fix
+RANGE_ERROR_HINTS = (
+    'block range',
+    'range limit',
+    'range is too large',
+    'too many blocks',
+    'query returned more than',
+    'response size',
+    'max results',
+    'too many results',
+    'too many logs',
+)
+
+# Fragments of the errors nodes return when a getLogs query runs out of time, which
+# for an oversized range is fixed by a smaller window (read timeouts are treated alike)
+TIMEOUT_ERROR_HINTS = (
+    'timed out',
+    'timeout',
+    'deadline exceeded',
+)
+
+# Fragments of throttling errors, which are retried after a backoff at the same window.
+# Whole phrases only: error text also carries block numbers and hashes
+THROTTLE_ERROR_HINTS = (
+    'rate limit',
+    'rate-limit',
+    'too many requests',
+)
+
+
+def is_range_error(e):
+    """True if e looks like a provider rejecting a getLogs request for being too large"""
+    message = str(e).lower()
+    return any(hint in message for hint in RANGE_ERROR_HINTS)
+
+
+def is_timeout_error(e):
+    """True if e looks like a request that took too long, on the client or the node"""
+    if isinstance(e, requests.ConnectTimeout):
+        # Never got to ask; the range has nothing to do with it
+        return False
+    if isinstance(e, requests.Timeout):
+        return True
+    message = str(e).lower()
+    return any(hint in message for hint in TIMEOUT_ERROR_HINTS)
+
+
+def is_throttle_error(e):
+    """True if e looks like rate limiting or a dropped connection rather than a problem with the request"""
+    if isinstance(e, requests.HTTPError):
+        return e.response is not None and e.response.status_code == 429
+    if isinstance(e, requests.ConnectionError):
+        return True
+    message = str(e).lower()
+    return any(hint in message for hint in THROTTLE_ERROR_HINTS)
+
+
+class LogScanner:
+    """
+        Fetches logs for one contract event over arbitrary block ranges with as few
+        eth_getLogs calls as the provider allows. The window halves whenever the
+        provider says a request was too large or the query timed out, and doubles
+        again after each success (staying at or below the last working size for a
+        while after a failure); the learned window is kept between scans. Throttled
+        requests, and timeouts at the smallest window, are retried with exponential
+        backoff at the same window
+    """
+
+    def __init__(self, event, window=DEFAULT_WINDOW, min_window=MIN_WINDOW, max_window=MAX_WINDOW, argument_filters=None,
+                 retries=THROTTLE_RETRIES, backoff=THROTTLE_BACKOFF):
+        self.event = event
+        self.window = window
+        self.min_window = min_window
+        self.max_window = max_window
+        self.argument_filters = argument_filters
+        self.retries = retries
+        self.backoff = backoff
+        self.calls = 0
+        self.ceiling = max_window  # growth stops here for a while after a range error
+        self.successes = 0
+
+    def fetch(self, start, end):
+        """One eth_getLogs call for blocks start..end (inclusive)"""
+        self.calls += 1
+        return self.event.get_logs(
+            from_block=start,
+            to_block=end,
+            argument_filters=self.argument_filters
+        )
+
+    def iter_windows(self, from_block, to_block):
+        """
+            Yields (start, end, logs) for consecutive windows covering from_block..to_block,
+            so callers can checkpoint after each one
+        """
+        start = from_block
+        throttled = 0
+        while start <= to_block:
+            end = min(start + self.window - 1, to_block)
+            try:
+                logs = self.fetch(start, end)
+            except Exception as e:
+                if self.window > self.min_window and (is_range_error(e) or is_timeout_error(e)):
+                    self.window = max(self.min_window, self.window // 2)
+                    self.ceiling = self.window
+                    self.successes = 0
+                    continue
+                if throttled < self.retries and (is_throttle_error(e) or is_timeout_error(e)):
+                    time.sleep(self.backoff * 2 ** throttled * (1 + random.random()))
+                    throttled += 1
+                    continue
+                raise
+
+            yield start, end, logs
+            start = end + 1
+            throttled = 0
+
+            self.successes += 1
+            if self.successes >= CEILING_RESET:
+                self.ceiling = self.max_window
+            self.window = min(self.ceiling, self.window * 2)
+
+    def iter_logs(self, from_block, to_block):
+        """Yields every log between from_block and to_block (inclusive) in block order"""
+        for _, _, logs in self.iter_windows(from_block, to_block):
+            yield from logs
+
+
+class RateLimiter:
+    """
+        Token bucket shared by every worker talking to one provider: at most
+        `rate` requests per second on average, with bursts of up to `burst`
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be made"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimitedScanner(LogScanner):
+    """A LogScanner whose requests are paced by a shared RateLimiter"""
+
+    def __init__(self, event, limiter, **kwargs):
+        super().__init__(event, **kwargs)
+        self.limiter = limiter
+
+    def fetch(self, start, end):
+        if self.limiter is not None:
+            self.limiter.acquire()
+        return super().fetch(start, end)
+
+
+def iter_backfill_logs(event, from_block, to_block, workers=DEFAULT_WORKERS, partition_size=DEFAULT_PARTITION,
+                       requests_per_second=DEFAULT_RATE, argument_filters=None, pin=None):
+    """
+        Yields every log of event between from_block and to_block (inclusive) in
+        (blockNumber, logIndex) order, fetched by a pool of worker threads. The range
+        is split into partitions of partition_size blocks, each scanned with its own
+        adaptive LogScanner, while a shared token bucket keeps the whole pool under
+        requests_per_second. At most 2 * workers partitions are fetched ahead of the
+        one being yielded, so memory stays bounded however long the range is.
+        pin (if given) returns a context manager each worker holds while scanning,
+        e.g. partial(connections.pinned, w3, endpoint) to keep the workers on the
+        endpoint the caller's thread is pinned to
+    """
+    if to_block < from_block:
+        return
+
+    limiter = RateLimiter(requests_per_second) if requests_per_second else None
+    partitions = (
+        (start, min(start + partition_size - 1, to_block))
+        for start in range(from_block, to_block + 1, partition_size)
+    )
+
+    def scan(partition):
+        scanner = RateLimitedScanner(
+            event, limiter,
+            window=min(DEFAULT_WINDOW, partition_size),
+            argument_filters=argument_filters
+        )
+        if pin is None:
+            return list(scanner.iter_logs(*partition))
+        with pin():
+            return list(scanner.iter_logs(*partition))
+
+    # Partitions are disjoint and each is already ordered, so yielding them in order is enough
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        pending = deque()
+        for partition in partitions:
+            pending.append(pool.submit(scan, partition))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def backfill_logs(event, from_block, to_block, workers=DEFAULT_WORKERS, partition_size=DEFAULT_PARTITION,
+                  requests_per_second=DEFAULT_RATE, argument_filters=None, pin=None):
+    """Returns every log iter_backfill_logs() yields for the range, as a list"""
+    return list(iter_backfill_logs(event, from_block, to_block, workers, partition_size,
+                                   requests_per_second, argument_filters, pin))
@@ -0,0 +1,607 @@
+import mmap
+import os
+import struct
+from collections import OrderedDict, deque
+from pathlib import Path
+from eth_hash.auto import keccak
+
+NODE_SIZE = 32  # bytes per node (bytes32)
+PROOF_CACHE_SIZE = 4096  # proofs an IncrementalMerkleTree keeps between changes
+
+# Tree file layout: fixed header, one uint64 node offset per level, the root, a keccak
+# checksum of everything before it, then (from the next mmap-aligned position) the
+# nodes exactly as MerkleTree stores them. Integers are little-endian
+FILE_MAGIC = b'MRKLTREE'
+FILE_VERSION = 1
+FILE_HEADER = struct.Struct('<8sIIQ')  # magic, version, level count, leaf count
+
+
+def hash_pair(a, b):
+    """
+        keccak256 of the two 32-byte nodes concatenated in ascending order, the
+        way OpenZeppelin's MerkleProof hashes pairs. Equal to
+        Web3.solidity_keccak(['bytes32', 'bytes32'], sorted([a, b])) without the ABI encoding
+    """
+    return keccak(a + b if a < b else b + a)
+
+
+def level_layout(leaf_count):
+    """Returns (sizes, offsets): the node count of each level and the node index where it starts"""
+    sizes = [leaf_count]
+    while sizes[-1] > 1:
+        sizes.append((sizes[-1] + 1) // 2)
+    offsets = []
+    total = 0
+    for size in sizes:
+        offsets.append(total)
+        total += size
+    return sizes, offsets
+
+
+def node_count(sizes):
+    return sum(sizes)
+
+
+class MerkleLevel:
+    """
+        Read-only view of one level of a MerkleTree that behaves like the list of
+        nodes it replaces: indexing (including negative indices and slices),
+        len(), iteration and == against a list of bytes
+    """
+
+    def __init__(self, nodes, start, size, level):
+        self.nodes = nodes
+        self.start = start
+        self.size = size
+        self.level = level
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.size))]
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("Merkle level index out of range")
+        start = self.start + index * NODE_SIZE
+        return bytes(self.nodes[start:start + NODE_SIZE])
+
+    def __iter__(self):
+        nodes = self.nodes
+        for start in range(self.start, self.start + self.size * NODE_SIZE, NODE_SIZE):
+            yield bytes(nodes[start:start + NODE_SIZE])
+
+    def __eq__(self, other):
+        if isinstance(other, MerkleLevel):
+            other = list(other)
+        try:
+            return len(other) == self.size and all(a == b for a, b in zip(self, other))
+        except TypeError:
+            return NotImplemented
+
+    def __repr__(self):
+        return f"MerkleLevel(level={self.level}, size={self.size})"
+
+
+class MerkleTree:
+    """
+        Merkle tree stored as one contiguous bytearray: the leaves, then each level
+        of parents up to the root, every node 32 bytes and located arithmetically
+        from its level's offset. Pairs are hashed sorted (see hash_pair) and an odd
+        node at the end of a level is carried up unchanged.
+
+        tree[i] is a MerkleLevel view, so code written for the list-of-levels form
+        (tree[0] the leaves, tree[-1] the root level) works unchanged
+    """
+
+    def __init__(self, leaves, nodes=None, count=None):
+        # leaves is a sequence of 32-byte values, a buffer of them packed back to back,
+        # or any iterable of them; an iterable is only streamed (never held in memory) if
+        # count, the number of leaves it yields, is given
+        packed = isinstance(leaves, (bytes, bytearray, memoryview))
+        if packed:
+            if len(leaves) % NODE_SIZE:
+                raise ValueError("Packed Merkle leaves must be a multiple of 32 bytes")
+            leaf_count = len(leaves) // NODE_SIZE
+        elif count is not None:
+            leaf_count = count
+        else:
+            leaves = leaves if isinstance(leaves, (list, tuple, MerkleLevel)) else list(leaves)
+            leaf_count = len(leaves)
+        self.sizes, self.offsets = level_layout(leaf_count)
+        # nodes may be a preallocated writable buffer (such as an mmap of a tree file)
+        self.nodes = bytearray(node_count(self.sizes) * NODE_SIZE) if nodes is None else nodes
+        if packed:
+            self.nodes[:leaf_count * NODE_SIZE] = leaves
+        else:
+            written = 0
+            for i, leaf in enumerate(leaves):
+                if i >= leaf_count:
+                    raise ValueError(f"More than the {leaf_count} Merkle leaves expected")
+                if len(leaf) != NODE_SIZE:
+                    raise ValueError("Merkle leaves must be 32 bytes")
+                self.nodes[i * NODE_SIZE:(i + 1) * NODE_SIZE] = leaf
+                written += 1
+            if written != leaf_count:
+                raise ValueError(f"Expected {leaf_count} Merkle leaves, got {written}")
+
+        for level in range(1, len(self.sizes)):
+            self._build_level(level)
+
+    def _build_level(self, level):
+        """Hash the pairs of level - 1 into level, reading and writing the buffer in place"""
+        nodes = self.nodes
+        child_size = self.sizes[level - 1]
+        start = self.offsets[level - 1] * NODE_SIZE
+        paired_end = start + (child_size // 2) * 2 * NODE_SIZE
+        out = self.offsets[level] * NODE_SIZE
+        for i in range(start, paired_end, 2 * NODE_SIZE):
+            a = nodes[i:i + NODE_SIZE]
+            b = nodes[i + NODE_SIZE:i + 2 * NODE_SIZE]
+            nodes[out:out + NODE_SIZE] = keccak(bytes(a + b if a < b else b + a))
+            out += NODE_SIZE
+        if child_size % 2:
+            nodes[out:out + NODE_SIZE] = nodes[paired_end:paired_end + NODE_SIZE]
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def __getitem__(self, level):
+        if isinstance(level, slice):
+            return [self[i] for i in range(*level.indices(len(self.sizes)))]
+        if level < 0:
+            level += len(self.sizes)
+        if not 0 <= level < len(self.sizes):
+            raise IndexError("Merkle tree level out of range")
+        return MerkleLevel(self.nodes, self.offsets[level] * NODE_SIZE, self.sizes[level], level)
+
+    def __iter__(self):
+        for level in range(len(self.sizes)):
+            yield self[level]
+
+    def __eq__(self, other):
+        try:
+            return len(other) == len(self) and all(a == b for a, b in zip(self, other))
+        except TypeError:
+            return NotImplemented
+
+    def node(self, level, index):
+        start = (self.offsets[level] + index) * NODE_SIZE
+        return bytes(self.nodes[start:start + NODE_SIZE])
+
+    @property
+    def root(self):
+        if not self.sizes[0]:
+            return None
+        return self.node(len(self.sizes) - 1, 0)
+
+    def proof(self, index):
+        """
+            Returns the proof of inclusion of leaf index: the sibling at each level,
+            bottom up, skipping levels where the node has no sibling
+        """
+        if not 0 <= index < self.sizes[0]:
+            raise IndexError("Merkle leaf index out of range")
+        proof = []
+        for level in range(len(self.sizes) - 1):
+            sibling = index ^ 1
+            if sibling < self.sizes[level]:
+                proof.append(self.node(level, sibling))
+            index //= 2
+        return proof
+
+
+class MappedMerkleTree(MerkleTree):
+    """
+        A MerkleTree read from a file written by save_merkle or write_merkle. The
+        nodes are memory-mapped rather than loaded, so opening is instant and only
+        the pages a proof touches are read, however large the tree.
+        The header checksum and the stored root are checked on open
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(self.path, 'rb')
+        try:
+            self._open()
+        except Exception:
+            self._file.close()
+            raise
+
+    def _open(self):
+        fixed = self._file.read(FILE_HEADER.size)
+        if len(fixed) < FILE_HEADER.size:
+            raise ValueError(f"{self.path} is not a Merkle tree file")
+        magic, version, level_count, leaf_count = FILE_HEADER.unpack(fixed)
+        if magic != FILE_MAGIC or version != FILE_VERSION:
+            raise ValueError(f"{self.path} is not a version {FILE_VERSION} Merkle tree file")
+
+        offsets_raw = self._file.read(8 * level_count)
+        root = self._file.read(NODE_SIZE)
+        checksum = self._file.read(NODE_SIZE)
+        if len(checksum) < NODE_SIZE or keccak(fixed + offsets_raw + root) != checksum:
+            raise ValueError(f"Corrupt Merkle tree file header in {self.path}")
+
+        self.sizes, self.offsets = level_layout(leaf_count)
+        if list(struct.unpack(f'<{level_count}Q', offsets_raw)) != self.offsets:
+            raise ValueError(f"Inconsistent level offsets in {self.path}")
+
+        length = node_count(self.sizes) * NODE_SIZE
+        data_start = _data_start(level_count)
+        if os.fstat(self._file.fileno()).st_size < data_start + length:
+            raise ValueError(f"Truncated Merkle tree file {self.path}")
+        self.nodes = mmap.mmap(self._file.fileno(), length, access=mmap.ACCESS_READ, offset=data_start) if length else b''
+        if length and self.root != root:
+            raise ValueError(f"Root checksum mismatch in {self.path}")
+
+    def close(self):
+        if isinstance(self.nodes, mmap.mmap):
+            self.nodes.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _data_start(level_count):
+    """Offset of the first node in a tree file: after the header, aligned for mmap"""
+    header = FILE_HEADER.size + 8 * level_count + 2 * NODE_SIZE
+    return -(-header // mmap.ALLOCATIONGRANULARITY) * mmap.ALLOCATIONGRANULARITY
+
+
+def _file_header(sizes, offsets, root):
+    header = FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION, len(sizes), sizes[0])
+    header += struct.pack(f'<{len(offsets)}Q', *offsets) + (root or bytes(NODE_SIZE))
+    return header + keccak(header)
+
+
+def _write_atomically(path, write):
+    """Calls write(file) on a temporary file that replaces path once it is complete"""
+    path = Path(path)
+    tmp = path.with_name(path.name + '.tmp')
+    try:
+        with open(tmp, 'w+b') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def save_merkle(tree, path):
+    """Writes tree (a MerkleTree, IncrementalMerkleTree or list of levels) to a tree file at path"""
+    sizes, offsets = level_layout(len(tree[0]))
+    if [len(level) for level in tree] != sizes:
+        raise ValueError("Tree levels do not match the Merkle tree layout")
+    root = tree[-1][0] if sizes[0] else None
+
+    def write(f):
+        data_start = _data_start(len(sizes))
+        f.truncate(data_start + node_count(sizes) * NODE_SIZE)
+        f.write(_file_header(sizes, offsets, root))
+        f.seek(data_start)
+        if isinstance(tree, MerkleTree):
+            f.write(tree.nodes)
+        elif isinstance(tree, IncrementalMerkleTree):
+            for level in tree.levels:
+                f.write(level)
+        else:
+            for level in tree:
+                f.write(b''.join(level))
+
+    _write_atomically(path, write)
+
+
+def write_merkle(leaves, path, count=None):
+    """
+        Builds the tree over leaves directly in a memory-mapped file at path, so
+        trees larger than memory can be built, and returns its root. leaves is a
+        packed buffer, a sequence, or an iterable (such as a generator) yielding
+        count leaves, which are streamed into the file one at a time
+    """
+    if isinstance(leaves, (bytes, bytearray, memoryview)):
+        leaf_count = len(leaves) // NODE_SIZE
+    elif count is not None:
+        leaf_count = count
+    elif isinstance(leaves, (list, tuple, MerkleLevel)):
+        leaf_count = len(leaves)
+    else:
+        raise TypeError("write_merkle needs count to stream leaves from an iterable")
+    sizes, offsets = level_layout(leaf_count)
+    length = node_count(sizes) * NODE_SIZE
+    data_start = _data_start(len(sizes))
+    result = {}
+
+    def write(f):
+        f.truncate(data_start + length)
+        root = None
+        if length:
+            nodes = mmap.mmap(f.fileno(), length, offset=data_start)
+            try:
+                root = MerkleTree(leaves, nodes, leaf_count).root
+                nodes.flush()
+            finally:
+                nodes.close()
+        f.seek(0)
+        f.write(_file_header(sizes, offsets, root))
+        result['root'] = root
+
+    _write_atomically(path, write)
+    return result['root']
+
+
+def load_merkle(path):
+    """Opens a tree file as a MappedMerkleTree"""
+    return MappedMerkleTree(path)
+
+
+class IncrementalMerkleTree:
+    """
+        Merkle tree with the same hashing and odd-node rule as MerkleTree whose
+        leaves can be appended or replaced after it is built. Each level is its own
+        growable bytearray, so a change only rehashes the O(log n) nodes on the
+        leaf's path to the root. Proofs are read from the stored levels and cached
+        until the next change
+    """
+
+    def __init__(self, leaves=()):
+        tree = leaves if isinstance(leaves, MerkleTree) else MerkleTree(leaves)
+        self.levels = [
+            bytearray(tree.nodes[offset * NODE_SIZE:(offset + size) * NODE_SIZE])
+            for offset, size in zip(tree.offsets, tree.sizes)
+        ]
+        self._proofs = OrderedDict()
+
+    @property
+    def size(self):
+        """Number of leaves"""
+        return len(self.levels[0]) // NODE_SIZE
+
+    def __len__(self):
+        return len(self.levels)
+
+    def __getitem__(self, level):
+        if isinstance(level, slice):
+            return [self[i] for i in range(*level.indices(len(self.levels)))]
+        if level < 0:
+            level += len(self.levels)
+        if not 0 <= level < len(self.levels):
+            raise IndexError("Merkle tree level out of range")
+        return MerkleLevel(self.levels[level], 0, len(self.levels[level]) // NODE_SIZE, level)
+
+    def __iter__(self):
+        for level in range(len(self.levels)):
+            yield self[level]
+
+    def __eq__(self, other):
+        try:
+            return len(other) == len(self) and all(a == b for a, b in zip(self, other))
+        except TypeError:
+            return NotImplemented
+
+    def node(self, level, index):
+        start = index * NODE_SIZE
+        return bytes(self.levels[level][start:start + NODE_SIZE])
+
+    @property
+    def root(self):
+        if not self.levels[0]:
+            return None
+        return self.node(len(self.levels) - 1, 0)
+
+    def append(self, leaf):
+        """Adds leaf at the end and returns its index"""
+        if len(leaf) != NODE_SIZE:
+            raise ValueError("Merkle leaves must be 32 bytes")
+        index = self.size
+        self.levels[0] += leaf
+        self._rehash(index)
+        return index
+
+    def extend(self, leaves):
+        for leaf in leaves:
+            self.append(leaf)
+
+    def update(self, index, leaf):
+        """Replaces leaf index"""
+        if len(leaf) != NODE_SIZE:
+            raise ValueError("Merkle leaves must be 32 bytes")
+        if not 0 <= index < self.size:
+            raise IndexError("Merkle leaf index out of range")
+        self.levels[0][index * NODE_SIZE:(index + 1) * NODE_SIZE] = leaf
+        self._rehash(index)
+
+    def _rehash(self, index):
+        """Recomputes the ancestors of leaf index, adding a node or a level where the tree grew"""
+        self._proofs.clear()
+        level = 0
+        while len(self.levels[level]) > NODE_SIZE:
+            size = len(self.levels[level]) // NODE_SIZE
+            sibling = index ^ 1
+            if sibling < size:
+                value = hash_pair(self.node(level, index), self.node(level, sibling))
+            else:
+                value = self.node(level, index)
+
+            if level + 1 == len(self.levels):
+                self.levels.append(bytearray())
+            parents = self.levels[level + 1]
+            index //= 2
+            start = index * NODE_SIZE
+            if start == len(parents):
+                parents += value
+            else:
+                parents[start:start + NODE_SIZE] = value
+            level += 1
+
+    def proof(self, index):
+        """Returns the proof of inclusion of leaf index, in the same form as MerkleTree.proof"""
+        proof = self._proofs.get(index)
+        if proof is not None:
+            self._proofs.move_to_end(index)
+            return list(proof)
+
+        if not 0 <= index < self.size:
+            raise IndexError("Merkle leaf index out of range")
+        proof = []
+        position = index
+        for level in range(len(self.levels) - 1):
+            sibling = position ^ 1
+            if sibling * NODE_SIZE < len(self.levels[level]):
+                proof.append(self.node(level, sibling))
+            position //= 2
+
+        self._proofs[index] = proof
+        if len(self._proofs) > PROOF_CACHE_SIZE:
+            self._proofs.popitem(last=False)
+        return list(proof)
+
+
+def build_merkle(leaves):
+    """Returns a MerkleTree over leaves (a list of 32-byte values, or a buffer of them packed together)"""
+    return MerkleTree(leaves)
+
+
+def prove_merkle(tree, index):
+    """
+        Proof of inclusion of leaf index in tree, which may be a MerkleTree or the
+        list-of-levels form (tree[0] the leaves, tree[-1] the root level)
+    """
+    if isinstance(tree, (MerkleTree, IncrementalMerkleTree)):
+        return tree.proof(index)
+    proof = []
+    for level in range(len(tree) - 1):
+        sibling = index ^ 1
+        if sibling < len(tree[level]):
+            proof.append(tree[level][sibling])
+        index //= 2
+    return proof
+
+
+def verify_merkle(root, leaf, proof):
+    """Recomputes the root from leaf and proof the way OpenZeppelin's MerkleProof.verify does"""
+    node = leaf
+    for sibling in proof:
+        node = hash_pair(node, sibling)
+    return node == root
+
+
+def prove_merkle_many(tree, indices):
+    """
+        Proofs of inclusion for many leaves in one level-by-level pass over tree;
+        returns them in the order of indices. Siblings shared between proofs are
+        the same bytes object, so thousands of proofs take little extra memory
+    """
+    positions = list(indices)
+    proofs = [[] for _ in positions]
+    read = tree.node if isinstance(tree, (MerkleTree, IncrementalMerkleTree)) else (lambda level, i: tree[level][i])
+    for level in range(len(tree) - 1):
+        size = len(tree[level])
+        siblings = {}
+        for k, position in enumerate(positions):
+            sibling = position ^ 1
+            if sibling < size:
+                node = siblings.get(sibling)
+                if node is None:
+                    node = siblings[sibling] = read(level, sibling)
+                proofs[k].append(node)
+            positions[k] = position // 2
+    return proofs
+
+
+def prove_multiproof(tree, indices):
+    """
+        Builds an OpenZeppelin multiproof for the leaves at indices, returning
+        (leaves, proof, proof_flags) for MerkleProof.multiProofVerify(proof, proofFlags,
+        root, leaves). Leaves are given in ascending index order and siblings that
+        are themselves being proven are not repeated in proof.
+
+        The verifier consumes leaves and intermediate hashes as one FIFO queue. A node
+        carried up unchanged from the end of an odd-sized level stays at the front of
+        that queue, so some index sets of non-power-of-two trees cannot be expressed
+        in this format; those raise ValueError (trees of 2^k leaves always work)
+    """
+    indices = sorted(set(indices))
+    if not indices:
+        raise ValueError("A multiproof needs at least one leaf")
+    sizes = [len(level) for level in tree]
+    if indices[0] < 0 or indices[-1] >= sizes[0]:
+        raise IndexError("Merkle leaf index out of range")
+    read = tree.node if isinstance(tree, (MerkleTree, IncrementalMerkleTree)) else (lambda level, i: tree[level][i])
+
+    top = len(sizes) - 1
+    queue = deque((0, i) for i in indices)  # (level, index) in the verifier's queue order
+    queued = set(queue)  # the same nodes, so membership tests do not scan the queue
+    proof = []
+    proof_flags = []
+    while len(queue) > 1 or queue[0][0] < top:
+        level, index = queue[0]
+        sibling = index ^ 1
+        if sibling >= sizes[level]:
+            # Carried up without hashing: fine only if nothing else of this level is queued behind it
+            if len(queue) > 1 and queue[1][0] == level:
+                raise ValueError(f"Leaves {indices} cannot be proven together in OpenZeppelin's multiproof format")
+            queued.remove(queue[0])
+            queue[0] = (level + 1, index // 2)
+            queued.add(queue[0])
+            continue
+
+        queued.remove(queue.popleft())
+        if queue and queue[0] == (level, sibling):
+            queued.remove(queue.popleft())
+            proof_flags.append(True)
+        elif (level, sibling) in queued:
+            raise ValueError(f"Leaves {indices} cannot be proven together in OpenZeppelin's multiproof format")
+        else:
+            proof.append(read(level, sibling))
+            proof_flags.append(False)
+        queue.append((level + 1, index // 2))
+        queued.add((level + 1, index // 2))
+
+    return [read(0, i) for i in indices], proof, proof_flags
+
+
+def process_multiproof(leaves, proof, proof_flags):
+    """Returns the root implied by a multiproof, computed exactly as MerkleProof.processMultiProof does"""
+    if len(leaves) + len(proof) != len(proof_flags) + 1:
+        raise ValueError("Invalid multiproof: lengths do not match")
+    hashes = []
+    leaf_pos = hash_pos = proof_pos = 0
+    for flag in proof_flags:
+        if leaf_pos < len(leaves):
+            a = leaves[leaf_pos]
+            leaf_pos += 1
+        else:
+            a = hashes[hash_pos]
+            hash_pos += 1
+        if not flag:
+            b = proof[proof_pos]
+            proof_pos += 1
+        elif leaf_pos < len(leaves):
+            b = leaves[leaf_pos]
+            leaf_pos += 1
+        else:
+            b = hashes[hash_pos]
+            hash_pos += 1
+        hashes.append(hash_pair(a, b))
+
+    if proof_flags:
+        if proof_pos != len(proof):
+            raise ValueError("Invalid multiproof: unused proof elements")
+        return hashes[-1]
+    return leaves[0] if leaves else proof[0]
+
+
+def verify_multiproof(root, leaves, proof, proof_flags):
+    """True if the multiproof shows leaves are all in the tree with root"""
+    try:
+        return process_multiproof(leaves, proof, proof_flags) == root
+    except (ValueError, IndexError):
+        return False
@@ -0,0 +1,176 @@
+import heapq
+import threading
+import time
+from web3.exceptions import TransactionNotFound
+
+# Nodes only accept a replacement for a pending transaction if its fees
+# are at least 10% higher, so bumps use 12.5% to stay clear of rounding
+FEE_BUMP_NUMERATOR = 9
+FEE_BUMP_DENOMINATOR = 8
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def is_nonce_too_low(e):
+    """True if a send failed because the nonce has already been used on chain"""
+    return 'nonce too low' in str(e).lower()
+
+
+def is_already_known(e):
+    """True if a send failed because the node already has this very transaction"""
+    message = str(e).lower()
+    return 'already known' in message or 'known transaction' in message
+
+
+def bump_fees(tx):
+    """
+        Returns a copy of the transaction dict tx with its gas price fields
+        (legacy or EIP-1559) raised enough for nodes to accept it as a replacement
+    """
+    tx = dict(tx)
+    for field in ('gasPrice', 'maxFeePerGas', 'maxPriorityFeePerGas'):
+        if field in tx:
+            tx[field] = tx[field] * FEE_BUMP_NUMERATOR // FEE_BUMP_DENOMINATOR + 1
+    return tx
+
+
+class NonceManager:
+    """
+        Hands out nonces for one account on one chain without a round-trip per
+        transaction, so many transactions can be in flight at once.
+        The allocator is reconciled against the chain on creation and whenever
+        a caller reports a failure, and keeps every sent transaction so a stuck
+        one can be replaced with higher fees
+    """
+
+    def __init__(self, w3, address):
+        self.w3 = w3
+        self.address = address
+        self._lock = threading.Lock()
+        self._next = None
+        self._free = []  # nonces handed out but never broadcast, reused first
+        self._allocated = set()  # nonces handed out whose send is not recorded or released yet
+        self.in_flight = {}  # nonce -> {'tx': dict, 'hashes': [tx hashes], 'sent': timestamp}
+        self.reconcile()
+
+    def reconcile(self):
+        """
+            Resynchronize with the chain: forget in-flight transactions that have
+            been mined and make any locally skipped nonces available again
+        """
+        mined = self.w3.eth.get_transaction_count(self.address, 'latest')
+        pending = self.w3.eth.get_transaction_count(self.address, 'pending')
+        with self._lock:
+            for nonce in [n for n in self.in_flight if n < mined]:
+                del self.in_flight[nonce]
+
+            # A nonce being sent by another thread right now counts as in flight
+            used = self.in_flight.keys() | self._allocated
+            local_next = max(used) + 1 if used else mined
+            self._next = max(pending, local_next)
+
+            # Nonces at or above the node's pending count that we are not tracking
+            # were never broadcast (or were dropped) and would block everything after them
+            gaps = set(n for n in self._free if n >= mined)
+            gaps.update(n for n in range(pending, self._next) if n not in used)
+            self._free = sorted(gaps)
+
+    def allocate(self):
+        """Returns the next nonce to use, filling gaps left by failed sends first"""
+        with self._lock:
+            if self._free:
+                nonce = heapq.heappop(self._free)
+            else:
+                nonce = self._next
+                self._next += 1
+            self._allocated.add(nonce)
+            return nonce
+
+    def release(self, nonce):
+        """Returns a nonce whose transaction was never broadcast"""
+        with self._lock:
+            self._allocated.discard(nonce)
+            self.in_flight.pop(nonce, None)
+            if nonce == self._next - 1:
+                self._next -= 1
+            elif nonce not in self._free:
+                heapq.heappush(self._free, nonce)
+
+    def record(self, nonce, tx, tx_hash):
+        """Remembers a broadcast transaction so it can be found and replaced later"""
+        with self._lock:
+            self._allocated.discard(nonce)
+            entry = self.in_flight.setdefault(nonce, {'tx': tx, 'hashes': [], 'sent': time.time()})
+            entry['tx'] = tx
+            entry['hashes'].append(tx_hash)
+            entry['sent'] = time.time()
+
+    def confirm(self, nonce):
+        """Marks the transaction using nonce as mined"""
+        with self._lock:
+            self.in_flight.pop(nonce, None)
+
+    def nonce_of(self, tx_hash):
+        """Returns the nonce of a transaction sent through this manager, or None"""
+        with self._lock:
+            for nonce, entry in self.in_flight.items():
+                if tx_hash in entry['hashes']:
+                    return nonce
+        return None
+
+    def hashes_of(self, nonce):
+        """Returns every hash broadcast for nonce, oldest first"""
+        with self._lock:
+            entry = self.in_flight.get(nonce)
+            return list(entry['hashes']) if entry else []
+
+    def was_broadcast(self, tx_hash):
+        """
+            True if a send of tx_hash that raised reached the node anyway: the node
+            knows the transaction. Its nonce must then not be released for reuse.
+            (A pending count past the nonce proves nothing: after "nonce too low"
+            it counts some other transaction)
+        """
+        try:
+            self.w3.eth.get_transaction(tx_hash)
+            return True
+        except TransactionNotFound:
+            return False
+
+    def replace(self, nonce, private_key):
+        """
+            Re-sends the in-flight transaction using nonce with bumped fees.
+            Returns the new transaction hash, or None if the nonce has already been mined
+        """
+        with self._lock:
+            entry = self.in_flight.get(nonce)
+            if entry is None:
+                return None
+            tx = bump_fees(entry['tx'])
+
+        if self.w3.eth.get_transaction_count(self.address, 'latest') > nonce:
+            return None
+
+        signed = self.w3.eth.account.sign_transaction(tx, private_key)
+        try:
+            tx_hash = self.w3.eth.send_raw_transaction(signed.raw_transaction)
+        except ValueError as e:
+            if is_nonce_too_low(e):
+                return None
+            raise
+        self.record(nonce, tx, tx_hash)
+        return tx_hash
+
+
+def get_nonce_manager(chain, w3, address):
+    """
+        Returns the shared NonceManager for address on chain, creating
+        (and reconciling) it on first use
+    """
+    key = (chain, address)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = _managers[key] = NonceManager(w3, address)
+    return manager
@@ -1,8 +1,8 @@
 import random
-import json
 from web3 import Web3
-from web3.middleware import ExtraDataToPOAMiddleware
-from web3.providers.rpc import HTTPProvider
+from config import load_config
+from connections import RPC_URLS, get_web3, get_contract
+from rpc_batch import view_calls
 
 
 # If you use one of the suggested infrastructure providers, the url will be of the form
@@ -11,31 +11,22 @@ from web3.providers.rpc import HTTPProvider
 # infura_url = f"https://mainnet.infura.io/v3/{infura_token}"
 
 def connect_to_eth():
-    url = "https://mainnet.infura.io/v3/def845368e8e47529180a15c63d275dc"  
-    w3 = Web3(HTTPProvider(url))
+    url = ', '.join(RPC_URLS['eth'])
+    w3 = get_web3('eth')
     assert w3.is_connected(), f"Failed to connect to provider at {url}"
     return w3
 
 
 def connect_with_middleware(contract_json):
     # TODO insert your code for this method from last week's assignment
-    with open(contract_json, "r") as f:
-        d = json.load(f)
-        d = d['bsc']
-        address = d['address']
-        abi = d['abi']
-        bnb_url = "https://data-seed-prebsc-1-s1.binance.org:8545/"
-    w3 = Web3(HTTPProvider(bnb_url))
+    d = load_config(contract_json).chain('bsc')
+    address = d.address
+    abi = d.abi
 
-    # The second section requires you to inject middleware into your w3 object and
-    # create a contract object. Read more on the docs pages at https://web3py.readthedocs.io/en/stable/middleware.html
-    # and https://web3py.readthedocs.io/en/stable/web3.contract.html
-
-    # Inject middleware for BNB (POA) chains
-    w3.middleware_onion.inject(ExtraDataToPOAMiddleware(), layer=0)
-
-    # Create contract object
-    contract = w3.eth.contract(address=address, abi=abi)
+    # The shared BNB connection already has the POA middleware injected,
+    # and the contract object is cached across calls
+    w3 = get_web3('bsc')
+    contract = get_contract('bsc', address, abi)
 
     return w3, contract
 
@@ -54,10 +45,6 @@ def is_ordered_block(w3, block_num):
     Conveniently, most type 2 transactions set the gasPrice field to be min( tx.maxPriorityFeePerGas + block.baseFeePerGas, tx.maxFeePerGas )
     """
     block = w3.eth.get_block(block_num, full_transactions=True)
-    ordered = False
-
-    w3 = connect_to_eth()  # Your connection function
-    block = w3.eth.get_block(block_num, full_transactions=True)
     base_fee = block.get('baseFeePerGas', None)
     txs = block['transactions']
 
@@ -100,17 +87,17 @@ def get_contract_values(contract, admin_address, owner_address):
 
     # TODO complete the following lines by performing contract calls
 
-    # Get and return the merkleRoot from the provided contract
-    onchain_root = contract.functions.merkleRoot().call()
-
-    # 2. Get the DEFAULT_ADMIN_ROLE key (usually bytes32(0))
-    DEFAULT_ADMIN_ROLE = contract.functions.DEFAULT_ADMIN_ROLE().call()
-
-    # Check the contract to see if the address "admin_address" has the role "default_admin_role"
-    has_role = contract.functions.hasRole(DEFAULT_ADMIN_ROLE, admin_address).call()
-
-    # Call the contract to get the prime owned by "owner_address"
-    prime = contract.functions.getPrimeByOwner(owner_address).call()
+    # The three reads go out in a single round-trip (Multicall3, or a JSON-RPC batch
+    # if the chain has no Multicall3). AccessControl's DEFAULT_ADMIN_ROLE is bytes32(0),
+    # so it is not fetched separately
+    onchain_root, has_role, prime = view_calls(contract.w3, [
+        # Get and return the merkleRoot from the provided contract
+        (contract, 'merkleRoot', ()),
+        # Check the contract to see if the address "admin_address" has the role "default_admin_role"
+        (contract, 'hasRole', (default_admin_role, admin_address)),
+        # Call the contract to get the prime owned by "owner_address"
+        (contract, 'getPrimeByOwner', (owner_address,)),
+    ])
 
     return onchain_root, has_role, prime
 
@@ -137,7 +124,7 @@ if __name__ == "__main__":
     n = 5
     for _ in range(n):
         block_num = random.randint(1, latest_block)
-        ordered = is_ordered_block(block_num)
+        ordered = is_ordered_block(eth_w3, block_num)
         if ordered:
             print(f"Block {block_num} is ordered")
         else:
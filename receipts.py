@@ -0,0 +1,159 @@
+import threading
+import time
+from concurrent.futures import Future
+
+from web3 import Web3
+from web3.exceptions import TimeExhausted
+
+from bridge_state import STATE_DB, track_receipts, tracked_receipts, untrack_receipts
+from connections import get_web3, resolve_chain
+from rpc_batch import batch_request
+
+POLL_INTERVAL = 2.0  # seconds between receipt polls (about one block on the bridge chains)
+BATCH_LIMIT = 100  # receipts requested per JSON-RPC batch
+DEFAULT_TIMEOUT = 120
+MAX_AGE = 24 * 3600  # persisted transactions older than this are dropped instead of resumed
+
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+
+def normalize_hash(tx_hash):
+    """Lowercase 0x-prefixed hex string for a transaction hash given as bytes or str"""
+    if not isinstance(tx_hash, str):
+        return Web3.to_hex(tx_hash).lower()
+    return (tx_hash if tx_hash.startswith('0x') else '0x' + tx_hash).lower()
+
+
+class Watch:
+    """One transaction being waited on: its hashes (original first, then fee-bumped replacements)"""
+
+    def __init__(self, watch_id, hashes, deadline):
+        self.watch_id = watch_id
+        self.hashes = hashes
+        self.deadline = deadline
+        self.future = Future()
+
+
+class ReceiptTracker:
+    """
+        Waits for transaction receipts on one chain without blocking the callers.
+        A single background thread polls the receipts of every tracked transaction
+        in JSON-RPC batches and resolves each transaction's Future when one of its
+        hashes is mined, or fails it with TimeExhausted when its timeout passes.
+        Tracked hashes are persisted in the state database until their receipt is
+        found, so after a restart resume() picks them up again
+    """
+
+    def __init__(self, w3, chain, state_db=STATE_DB, poll_interval=POLL_INTERVAL, batch_limit=BATCH_LIMIT):
+        self.w3 = w3
+        self.chain = chain
+        self.state_db = state_db
+        self.poll_interval = poll_interval
+        self.batch_limit = batch_limit
+        self.watches = {}  # watch_id (first hash) -> Watch
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def track(self, tx_hashes, timeout=DEFAULT_TIMEOUT, callback=None):
+        """
+            Start waiting for a transaction and return a Future that resolves to the
+            receipt of whichever of tx_hashes is mined first, or raises TimeExhausted
+            after timeout seconds. tx_hashes is one hash, or the original hash followed
+            by its replacements; tracking it again with more hashes extends the same wait.
+            callback(future) is called once the Future is resolved
+        """
+        if isinstance(tx_hashes, (str, bytes)):
+            tx_hashes = [tx_hashes]
+        hashes = [normalize_hash(h) for h in tx_hashes]
+        watch_id = hashes[0]
+        track_receipts(self.chain, watch_id, hashes, self.state_db)
+
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            watch = self.watches.get(watch_id)
+            if watch is None or watch.future.done():
+                watch = self.watches[watch_id] = Watch(watch_id, hashes, deadline)
+            else:
+                watch.hashes = list(dict.fromkeys(watch.hashes + hashes))
+                watch.deadline = max(watch.deadline, deadline)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"receipts-{self.chain}", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+        if callback is not None:
+            watch.future.add_done_callback(callback)
+        return watch.future
+
+    def resume(self, timeout=DEFAULT_TIMEOUT):
+        """
+            Track again the transactions persisted by an earlier run.
+            Returns a list of (tx hashes, Future), one per transaction
+        """
+        resumed = []
+        for watch_id, (hashes, added) in tracked_receipts(self.chain, self.state_db).items():
+            if time.time() - added > MAX_AGE:
+                untrack_receipts(self.chain, watch_id, self.state_db)
+                continue
+            resumed.append((hashes, self.track(hashes, timeout)))
+        return resumed
+
+    def wait(self, tx_hashes, timeout=DEFAULT_TIMEOUT):
+        """Blocking form of track(): returns the receipt or raises TimeExhausted"""
+        return self.track(tx_hashes, timeout).result()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self.watches:
+                    self._cond.wait()
+            # Give newly sent transactions a chance to be mined before asking
+            time.sleep(self.poll_interval)
+            with self._cond:
+                watches = list(self.watches.values())
+            try:
+                self.poll(watches)
+            except Exception as e:
+                print(f"Error polling receipts on {self.chain}: {e}")
+
+    def poll(self, watches):
+        """Check every hash of watches in as few batches as possible and resolve the finished ones"""
+        hashes = [h for watch in watches for h in watch.hashes]
+        mined = set()
+        for i in range(0, len(hashes), self.batch_limit):
+            chunk = hashes[i:i + self.batch_limit]
+            results = batch_request(self.w3, [('eth_getTransactionReceipt', [h]) for h in chunk])
+            mined.update(h for h, receipt in zip(chunk, results) if receipt is not None)
+
+        now = time.monotonic()
+        for watch in watches:
+            tx_hash = next((h for h in watch.hashes if h in mined), None)
+            if tx_hash is not None:
+                # Re-read the mined receipt through web3 so callers get the usual formatted receipt
+                receipt = self.w3.eth.get_transaction_receipt(tx_hash)
+                untrack_receipts(self.chain, watch.watch_id, self.state_db)
+                self._finish(watch)
+                watch.future.set_result(receipt)
+            elif now >= watch.deadline:
+                # Still persisted: the transaction may yet be mined, or be replaced by the caller
+                self._finish(watch)
+                watch.future.set_exception(TimeExhausted(
+                    f"Transaction {watch.hashes[-1]} is not in the chain after waiting for its receipt"
+                ))
+
+    def _finish(self, watch):
+        with self._cond:
+            if self.watches.get(watch.watch_id) is watch:
+                del self.watches[watch.watch_id]
+
+
+def get_receipt_tracker(chain, state_db=STATE_DB):
+    """Returns the shared ReceiptTracker for chain"""
+    chain = resolve_chain(chain)
+    key = (chain, str(state_db))
+    with _trackers_lock:
+        tracker = _trackers.get(key)
+        if tracker is None:
+            tracker = _trackers[key] = ReceiptTracker(get_web3(chain), chain, state_db)
+    return tracker
@@ -0,0 +1,157 @@
+import weakref
+import requests
+from eth_utils import get_abi_output_types
+
+from rpc_pool import is_rate_limited
+
+# Multicall3 is deployed at the same address on Ethereum, BSC, Avalanche and their testnets
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+MULTICALL3_ABI = [
+    {
+        "inputs": [
+            {
+                "components": [
+                    {"internalType": "address", "name": "target", "type": "address"},
+                    {"internalType": "bool", "name": "allowFailure", "type": "bool"},
+                    {"internalType": "bytes", "name": "callData", "type": "bytes"}
+                ],
+                "internalType": "struct Multicall3.Call3[]",
+                "name": "calls",
+                "type": "tuple[]"
+            }
+        ],
+        "name": "aggregate3",
+        "outputs": [
+            {
+                "components": [
+                    {"internalType": "bool", "name": "success", "type": "bool"},
+                    {"internalType": "bytes", "name": "returnData", "type": "bytes"}
+                ],
+                "internalType": "struct Multicall3.Result[]",
+                "name": "returnData",
+                "type": "tuple[]"
+            }
+        ],
+        "stateMutability": "payable",
+        "type": "function"
+    }
+]
+
+# Web3 instances whose provider has rejected a batch (or has no Multicall3); they go straight to the fallback
+_no_batch = weakref.WeakSet()
+_no_multicall = weakref.WeakSet()
+
+
+class RPCError(ValueError):
+    """A JSON-RPC error returned for one request of a batch"""
+
+
+def _result(response):
+    if 'error' in response:
+        error = response['error']
+        message = error.get('message', error) if isinstance(error, dict) else error
+        raise RPCError(message)
+    return response['result']
+
+
+def rejects_batch(e):
+    """
+        True if e, raised by a batch request, shows the node does not take batches:
+        an HTTP 4xx other than throttling, or a reply that is not JSON-RPC at all.
+        Timeouts, connection errors, 429 and 5xx are transient and say nothing about batching
+    """
+    if isinstance(e, requests.HTTPError):
+        status = e.response.status_code if e.response is not None else None
+        return status is not None and 400 <= status < 500 and status != 429
+    if isinstance(e, requests.RequestException):
+        return False
+    # Undecodable replies surface as ValueError (json.JSONDecodeError included)
+    return isinstance(e, ValueError) and not isinstance(e, RPCError)
+
+
+def batch_request(w3, calls):
+    """
+        Sends calls, a list of (method, params) JSON-RPC calls, to w3's provider
+        as a single batch and returns the raw results in order. Providers that reject
+        batches (an invalid-request error or a reply that is not one response per
+        call) are remembered and served one request at a time instead; transient
+        transport errors are raised for the caller to retry.
+        Raises RPCError if any request in the batch failed
+    """
+    calls = list(calls)
+    if not calls:
+        return []
+
+    if w3 not in _no_batch:
+        try:
+            responses = w3.provider.make_batch_request(calls)
+        except Exception as e:
+            if not rejects_batch(e):
+                raise
+            responses = None
+        if isinstance(responses, list) and len(responses) == len(calls):
+            return [_result(response) for response in responses]
+        if is_rate_limited(responses):
+            # One error for the whole batch, but it is throttling rather than a rejection
+            _result(responses)
+        _no_batch.add(w3)
+
+    return [_result(w3.provider.make_request(method, params)) for method, params in calls]
+
+
+def encode_call(contract, fn_name, args=()):
+    """Returns the calldata for contract.fn_name(*args)"""
+    return contract.encode_abi(fn_name, args=list(args))
+
+
+def decode_output(w3, contract, fn_name, data):
+    """Decodes return data from contract.fn_name, unwrapping single return values"""
+    output_types = get_abi_output_types(contract.get_function_by_name(fn_name).abi)
+    decoded = w3.codec.decode(output_types, bytes(data))
+    return decoded[0] if len(decoded) == 1 else decoded
+
+
+def multicall(w3, calls, allow_failure=False, block='latest'):
+    """
+        Runs calls, a list of (contract, fn_name, args) view calls, in one eth_call
+        through Multicall3 and returns their decoded results in order.
+        With allow_failure, a reverted call yields None instead of failing the whole batch
+    """
+    aggregator = w3.eth.contract(address=MULTICALL3_ADDRESS, abi=MULTICALL3_ABI)
+    payload = [
+        (contract.address, allow_failure, encode_call(contract, fn_name, args))
+        for contract, fn_name, args in calls
+    ]
+    results = aggregator.functions.aggregate3(payload).call(block_identifier=block)
+
+    values = []
+    for (contract, fn_name, _), (success, data) in zip(calls, results):
+        values.append(decode_output(w3, contract, fn_name, data) if success else None)
+    return values
+
+
+def view_calls(w3, calls, block='latest'):
+    """
+        Runs calls, a list of (contract, fn_name, args) view calls, in as few round-trips
+        as the chain allows: one Multicall3 call, else one batch of eth_calls,
+        else one eth_call at a time. Returns the decoded results in order
+    """
+    calls = list(calls)
+    if w3 not in _no_multicall:
+        try:
+            return multicall(w3, calls, block=block)
+        except Exception:
+            # Only stop trying Multicall3 if it is not deployed; a reverting call
+            # falls through to the fallback so the error surfaces for that call
+            if not w3.eth.get_code(MULTICALL3_ADDRESS):
+                _no_multicall.add(w3)
+
+    rpc_calls = [
+        ('eth_call', [{'to': contract.address, 'data': encode_call(contract, fn_name, args)}, block])
+        for contract, fn_name, args in calls
+    ]
+    results = batch_request(w3, rpc_calls)
+    return [
+        decode_output(w3, contract, fn_name, bytes.fromhex(data[2:]))
+        for (contract, fn_name, _), data in zip(calls, results)
+    ]
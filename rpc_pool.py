@@ -0,0 +1,216 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import requests
+from web3 import Web3
+from web3.providers import JSONBaseProvider
+
+EWMA_ALPHA = 0.2  # weight of the newest sample in the rolling latency/error averages
+FAILURES_BEFORE_COOLDOWN = 3
+COOLDOWN = 30.0  # seconds an endpoint sits out after repeated failures
+HEDGE_AFTER = 1.0  # seconds to wait on the fastest endpoint before also asking the next one
+MAX_RETRIES = 3
+BACKOFF = 0.25  # base delay for exponential backoff between retries
+
+# Never hedge writes; broadcasting a transaction twice only produces "already known" errors
+WRITE_METHODS = {'eth_sendRawTransaction', 'eth_sendTransaction'}
+
+# JSON-RPC error codes providers use for throttling
+RATE_LIMIT_CODES = {429, -32005, -32029}
+
+
+class RateLimited(Exception):
+    """An endpoint answered with a throttling error"""
+
+
+def is_retryable(e):
+    """True for errors worth retrying on another endpoint: timeouts, connection errors, 429 and 5xx"""
+    if isinstance(e, RateLimited):
+        return True
+    if isinstance(e, requests.HTTPError):
+        status = e.response.status_code if e.response is not None else None
+        return status is None or status == 429 or status >= 500
+    return isinstance(e, (requests.ConnectionError, requests.Timeout))
+
+
+def is_rate_limited(response):
+    error = response.get('error') if isinstance(response, dict) else None
+    if not isinstance(error, dict):
+        return False
+    return error.get('code') in RATE_LIMIT_CODES or 'rate limit' in str(error.get('message', '')).lower()
+
+
+class Endpoint:
+    """One RPC URL in a pool, with its rolling latency and error rate"""
+
+    def __init__(self, url, session=None):
+        self.url = url
+        self.provider = Web3.HTTPProvider(url, session=session, exception_retry_configuration=None)
+        self.latency = 0.0  # EWMA seconds; 0 until measured, so new endpoints get tried early
+        self.error_rate = 0.0  # EWMA of failures
+        self.failures = 0  # consecutive
+        self.down_until = 0.0
+        self._lock = threading.Lock()
+
+    def healthy(self, now=None):
+        return (now or time.monotonic()) >= self.down_until
+
+    def score(self):
+        """Lower is better: latency penalized by recent errors"""
+        return self.latency * (1 + 4 * self.error_rate)
+
+    def record_success(self, seconds):
+        with self._lock:
+            self.latency = seconds if self.latency == 0 else (1 - EWMA_ALPHA) * self.latency + EWMA_ALPHA * seconds
+            self.error_rate *= (1 - EWMA_ALPHA)
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.error_rate = (1 - EWMA_ALPHA) * self.error_rate + EWMA_ALPHA
+            self.failures += 1
+            if self.failures >= FAILURES_BEFORE_COOLDOWN:
+                self.down_until = time.monotonic() + COOLDOWN
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'latency_ms': 1000 * self.latency,
+                'error_rate': self.error_rate,
+                'healthy': self.healthy(),
+            }
+
+
+class PooledProvider(JSONBaseProvider):
+    """
+        A provider backed by several RPC endpoints for the same chain.
+        Requests go to the endpoint with the best rolling latency/error score; reads
+        still unanswered after hedge_after seconds are also sent to the next endpoint
+        and the first answer wins. Throttling (429), 5xx and connection errors fail
+        over to the next endpoint and are retried with exponential backoff, and an
+        endpoint that keeps failing sits out for COOLDOWN seconds.
+        Reads that must agree with each other (a head block and the logs up to it)
+        are made inside pinned(), which sends everything to a single endpoint
+    """
+
+    def __init__(self, urls, session_factory=None, hedge_after=HEDGE_AFTER, max_retries=MAX_RETRIES, backoff=BACKOFF):
+        super().__init__()
+        if not urls:
+            raise ValueError("PooledProvider needs at least one endpoint")
+        self.endpoints = [
+            Endpoint(url, session_factory(url) if session_factory else None)
+            for url in urls
+        ]
+        self.hedge_after = hedge_after
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._executor = ThreadPoolExecutor(max_workers=4 * len(self.endpoints))
+        self._pin = threading.local()  # .endpoint: the endpoint this thread is pinned to
+
+    def __str__(self):
+        return f"PooledProvider({', '.join(e.url for e in self.endpoints)})"
+
+    def ranked(self):
+        """Healthy endpoints fastest first, then the ones cooling down"""
+        now = time.monotonic()
+        healthy = sorted((e for e in self.endpoints if e.healthy(now)), key=Endpoint.score)
+        cooling = sorted((e for e in self.endpoints if not e.healthy(now)), key=lambda e: e.down_until)
+        return healthy + cooling
+
+    def _timed(self, endpoint, call):
+        start = time.monotonic()
+        try:
+            response = call(endpoint.provider)
+        except Exception:
+            endpoint.record_failure()
+            raise
+        if is_rate_limited(response):
+            endpoint.record_failure()
+            raise RateLimited(f"{endpoint.url} is rate limiting requests")
+        endpoint.record_success(time.monotonic() - start)
+        return response
+
+    def _dispatch(self, call, hedge):
+        """One attempt: fastest endpoint first, hedging and failing over down the ranking"""
+        remaining = self.ranked()
+        running = {}
+        error = None
+
+        def launch():
+            endpoint = remaining.pop(0)
+            running[self._executor.submit(self._timed, endpoint, call)] = endpoint
+
+        launch()
+        while running:
+            timeout = self.hedge_after if hedge and remaining else None
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # The current endpoint is slow; race it against the next one
+                launch()
+                continue
+            for future in done:
+                del running[future]
+                try:
+                    return future.result()
+                except Exception as e:
+                    if not is_retryable(e):
+                        raise
+                    error = e
+            if not running and remaining:
+                launch()
+        raise error
+
+    @contextmanager
+    def pinned(self, endpoint=None):
+        """
+            Routes every request the calling thread makes through this provider to one
+            endpoint (endpoint, or the best ranked when the first pin is taken) until
+            the outermost pinned() exits, without hedging or failing over. Endpoints
+            can lag each other by many blocks, and a lagging node answers eth_getLogs
+            above its own head with no logs, so a head read, the logs up to it and the
+            reorg check of one scan must come from the same node. Errors are retried
+            on that endpoint only and then raised, ending the scan rather than mixing
+            nodes. The pin is per thread, so other threads keep failover and hedging;
+            worker threads of a pinned scan join it by passing the yielded Endpoint
+        """
+        outer = getattr(self._pin, 'endpoint', None)
+        if outer is None:
+            self._pin.endpoint = endpoint or self.ranked()[0]
+        elif endpoint is not None and endpoint is not outer:
+            raise ValueError(f"Already pinned to {outer.url}")
+        try:
+            yield self._pin.endpoint
+        finally:
+            if outer is None:
+                self._pin.endpoint = None
+
+    def _with_retries(self, call, hedge):
+        pinned = getattr(self._pin, 'endpoint', None)
+        for attempt in range(self.max_retries + 1):
+            try:
+                if pinned is not None:
+                    return self._timed(pinned, call)
+                return self._dispatch(call, hedge)
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                time.sleep(self.backoff * 2 ** attempt * (1 + random.random()))
+
+    def make_request(self, method, params):
+        return self._with_retries(
+            lambda provider: provider.make_request(method, params),
+            hedge=method not in WRITE_METHODS
+        )
+
+    def make_batch_request(self, batch_requests):
+        hedge = not any(method in WRITE_METHODS for method, _ in batch_requests)
+        return self._with_retries(
+            lambda provider: provider.make_batch_request(batch_requests),
+            hedge=hedge
+        )
+
+    def health(self):
+        """Returns {url: rolling latency, error rate and health} for every endpoint"""
+        return {e.url: e.snapshot() for e in self.endpoints}
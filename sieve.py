@@ -0,0 +1,83 @@
+import itertools
+from math import isqrt
+
+SEGMENT_SIZE = 1 << 18  # odd numbers per segment; a 256 KiB bytearray stays cache friendly
+LEAF_SIZE = 32  # bytes per bytes32 leaf
+
+
+def odd_primes_upto(limit):
+    """Odd primes <= limit from a plain odd-only sieve (used for the small base primes)"""
+    if limit < 3:
+        return []
+    size = (limit - 1) // 2  # flags[j] is 2j + 3
+    flags = bytearray(b'\x01') * size
+    for j in range((isqrt(limit) - 1) // 2):
+        if flags[j]:
+            p = 2 * j + 3
+            start = (p * p - 3) // 2
+            flags[start::p] = bytes(len(range(start, size, p)))
+    return list(itertools.compress(range(3, 2 * size + 3, 2), flags))
+
+
+def prime_segments(segment_size=SEGMENT_SIZE):
+    """
+        Yields the primes in ascending order, one list per segment, indefinitely.
+        Each segment sieves segment_size consecutive odd numbers in a bytearray,
+        crossing off multiples of the base primes with slice assignment, so memory
+        stays at one segment plus the base primes up to the square root
+    """
+    yield [2]
+    zeros = memoryview(bytes(segment_size))
+    base = []
+    base_limit = 1
+    low = 3
+    while True:
+        high = low + 2 * segment_size  # the segment holds low, low + 2, ..., high - 2
+        if isqrt(high) > base_limit:
+            base_limit = max(isqrt(high), 2 * base_limit)
+            base = odd_primes_upto(base_limit)
+
+        flags = bytearray(b'\x01') * segment_size  # flags[j] is low + 2j
+        for p in base:
+            square = p * p
+            if square >= high:
+                break
+            # First odd multiple of p in the segment, never p itself
+            start = max(square, -(-low // p) * p)
+            if start % 2 == 0:
+                start += p
+            j = (start - low) // 2
+            if j < segment_size:
+                flags[j::p] = zeros[:(segment_size - 1 - j) // p + 1]
+
+        yield list(itertools.compress(range(low, high, 2), flags))
+        low = high
+
+
+def iter_primes(segment_size=SEGMENT_SIZE):
+    """Yields every prime in ascending order"""
+    for segment in prime_segments(segment_size):
+        yield from segment
+
+
+def first_primes(n, segment_size=SEGMENT_SIZE):
+    """Returns the first n primes as a list of ints"""
+    return list(itertools.islice(iter_primes(segment_size), n))
+
+
+def prime_leaves(n, segment_size=SEGMENT_SIZE):
+    """
+        Returns the first n primes as bytes32 leaves (big-endian, the same values as
+        submitProof.convert_leaves) packed into one contiguous bytearray of n * 32
+        bytes, written segment by segment without building a list of leaf objects
+    """
+    leaves = bytearray(n * LEAF_SIZE)
+    count = 0
+    for segment in prime_segments(segment_size):
+        segment = segment[:n - count]
+        start = count * LEAF_SIZE
+        count += len(segment)
+        leaves[start:count * LEAF_SIZE] = b''.join([p.to_bytes(LEAF_SIZE, 'big') for p in segment])
+        if count >= n:
+            break
+    return leaves
@@ -1,7 +1,20 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
 from web3 import Web3
 import eth_account
 from eth_account import Account
-from eth_account.messages import encode_defunct
+from eth_account.messages import SignableMessage, encode_defunct
+from eth_hash.auto import keccak
+
+SIGNATURE_SIZE = 65  # r, s, v
+RECOVERY_CHUNK = 256  # signatures recovered per task sent to a worker process
+RECOVERY_CACHE_SIZE = 65536  # (message hash, signature) -> recovered address entries kept
+
+_recovered = OrderedDict()
+_recovered_lock = threading.Lock()
 
 
 def sign(m):
@@ -42,6 +55,101 @@ def verify(m, public_key, signed_message):
     return valid_signature
 
 
+def signature_bytes(signature):
+    """
+        The 65 signature bytes of a SignedMessage, bytes or hex string,
+        or None if the signature is malformed
+    """
+    signature = getattr(signature, 'signature', signature)
+    if isinstance(signature, str):
+        try:
+            signature = bytes.fromhex(signature[2:] if signature[:2] in ('0x', '0X') else signature)
+        except ValueError:
+            return None
+    if not isinstance(signature, (bytes, bytearray)) or len(signature) != SIGNATURE_SIZE:
+        return None
+    return bytes(signature)
+
+
+def message_hash(message):
+    """The EIP-191 hash that is signed for message (a text string or a SignableMessage)"""
+    if not isinstance(message, SignableMessage):
+        message = encode_defunct(text=message)
+    return keccak(b'\x19' + message.version + message.header + message.body)
+
+
+def _recover_chunk(jobs):
+    """Recovers the signer of each (SignableMessage, signature) in jobs, or None if recovery fails"""
+    signers = []
+    for message, signature in jobs:
+        try:
+            signers.append(Account.recover_message(message, signature=signature))
+        except Exception:
+            # Well-formed but invalid signatures (bad v, r or s) are rejected by eth_keys
+            signers.append(None)
+    return signers
+
+
+def _cached_signer(key):
+    with _recovered_lock:
+        if key not in _recovered:
+            return False, None
+        _recovered.move_to_end(key)
+        return True, _recovered[key]
+
+
+def _cache_signer(key, signer):
+    with _recovered_lock:
+        _recovered[key] = signer
+        if len(_recovered) > RECOVERY_CACHE_SIZE:
+            _recovered.popitem(last=False)
+
+
+def verify_many(triples, workers=None, chunk_size=RECOVERY_CHUNK, cache=True):
+    """
+        Verifies many (message, address, signature) triples and returns a list of
+        booleans in the same order. Messages are text strings or SignableMessages,
+        signatures are SignedMessages, bytes or hex strings.
+        Malformed signatures fail without any recovery, repeated (message, signature)
+        pairs are recovered once, and the rest are recovered in chunks of chunk_size
+        across a pool of workers processes (all cores by default). With cache, signers
+        are remembered between calls, keyed by (message hash, signature)
+    """
+    triples = list(triples)
+    results = [False] * len(triples)
+    pending = {}  # (message hash, signature) -> (SignableMessage, [(index, address)])
+    for i, (message, address, signature) in enumerate(triples):
+        signature = signature_bytes(signature)
+        if signature is None:
+            continue
+        if not isinstance(message, SignableMessage):
+            message = encode_defunct(text=message)
+        key = (message_hash(message), signature)
+        found, signer = _cached_signer(key) if cache else (False, None)
+        if found:
+            results[i] = signer is not None and signer.lower() == address.lower()
+        else:
+            pending.setdefault(key, (message, []))[1].append((i, address))
+
+    keys = list(pending)
+    jobs = [(pending[key][0], key[1]) for key in keys]
+    chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    if workers <= 1:
+        # A pool only pays for itself once there is more than one chunk to share out
+        signers = [signer for chunk in chunks for signer in _recover_chunk(chunk)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            signers = [signer for chunk in pool.map(_recover_chunk, chunks) for signer in chunk]
+
+    for key, signer in zip(keys, signers):
+        if cache:
+            _cache_signer(key, signer)
+        for i, address in pending[key][1]:
+            results[i] = signer is not None and signer.lower() == address.lower()
+    return results
+
+
 if __name__ == "__main__":
     import random
     import string
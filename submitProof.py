@@ -1,10 +1,13 @@
 import eth_account
+import merkle
+import sieve
 import random
 import string
-import json
 from pathlib import Path
-from web3 import Web3
-from web3.middleware import ExtraDataToPOAMiddleware  # Necessary for POA chains
+from config import load_config
+from connections import get_web3, get_contract
+from fees import transaction_params
+from receipts import get_receipt_tracker
 
 
 def merkle_assignment():
@@ -16,16 +19,20 @@ def merkle_assignment():
     """
     # Generate the list of primes as integers
     num_of_primes = 8192
-    primes = generate_primes(num_of_primes)
+    tree = load_tree(num_of_primes)
+    if tree is None:
+        primes = generate_primes(num_of_primes)
 
-    # Create a version of the list of primes in bytes32 format
-    leaves = convert_leaves(primes)
+        # Create a version of the list of primes in bytes32 format
+        leaves = convert_leaves(primes)
 
-    # Build a Merkle tree using the bytes32 leaves as the Merkle tree's leaves
-    tree = build_merkle(leaves)
+        # Build a Merkle tree using the bytes32 leaves as the Merkle tree's leaves
+        tree = build_merkle(leaves)
+        save_tree(tree, num_of_primes)
+    leaves = tree[0]
 
     # Select a random leaf and create a proof for that leaf
-    random_leaf_index = random.randint(1, len(primes) - 1)
+    random_leaf_index = random.randint(1, len(leaves) - 1)
     proof = prove_merkle(tree, random_leaf_index)
 
     # This is the same way the grader generates a challenge for sign_challenge()
@@ -45,36 +52,9 @@ def generate_primes(num_primes):
         Function to generate the first 'num_primes' prime numbers
         returns list (with length n) of primes (as ints) in ascending order
     """
-    primes_list = []
-
     #TODO YOUR CODE HERE
-    if num_primes < 6:
-        limit = 30
-    else:
-        import math
-        limit = int(num_primes * (math.log(num_primes) + math.log(math.log(num_primes))))
-    
-    # Create a boolean array "prime[0..limit]" and initialize
-    # all entries as true
-    prime = [True] * (limit + 1)
-    p = 2
-    
-    while p * p <= limit:
-        # If prime[p] is not changed, then it is a prime
-        if prime[p]:
-            # Update all multiples of p
-            for i in range(p * p, limit + 1, p):
-                prime[i] = False
-        p += 1
-    
-    # Collect all prime numbers
-    for p in range(2, limit + 1):
-        if prime[p]:
-            primes_list.append(p)
-            if len(primes_list) >= num_primes:
-                break
-    
-    return primes_list[:num_primes]
+    # Segmented odd-only bytearray sieve; see sieve.py
+    return sieve.first_primes(num_primes)
 
 
 def convert_leaves(primes_list):
@@ -102,29 +82,8 @@ def build_merkle(leaves):
     """
 
     #TODO YOUR CODE HERE
-    tree = []
-    current_level = leaves[:]  
-    tree.append(current_level[:])  
-    
-    while len(current_level) > 1:
-        next_level = []
-        
-
-        for i in range(0, len(current_level), 2):
-            if i + 1 < len(current_level):
-                
-                parent_hash = hash_pair(current_level[i], current_level[i + 1])
-            else:
-                
-                parent_hash = current_level[i]
-            
-            next_level.append(parent_hash)
-        
-        current_level = next_level
-        tree.append(current_level[:])  
-    
-    return tree
-
+    # One contiguous buffer of nodes; tree[i] still reads like the list of level i
+    return merkle.build_merkle(leaves)
 
 
 def prove_merkle(merkle_tree, random_indx):
@@ -134,26 +93,38 @@ def prove_merkle(merkle_tree, random_indx):
         parent hash values, up to index -1 which is the list of the root hash.
         returns a proof of inclusion as list of values
     """
-    merkle_proof = []
     # TODO YOUR CODE HERE
-    current_index = random_indx
-    
-    for level in range(len(merkle_tree) - 1): 
-        current_level = merkle_tree[level]
-        
+    return merkle.prove_merkle(merkle_tree, random_indx)
 
-        if current_index % 2 == 0:  
-            sibling_index = current_index + 1
-        else:  
-            sibling_index = current_index - 1
-        
 
-        if sibling_index < len(current_level):
-            merkle_proof.append(current_level[sibling_index])
-        
-        current_index = current_index // 2
+def tree_file(num_of_primes):
+    return Path(__file__).parent.absolute() / f"primes_{num_of_primes}.merkle"
 
-    return merkle_proof
+
+def load_tree(num_of_primes):
+    """
+        The tree over the first num_of_primes primes never changes, so it is saved
+        after the first build and memory-mapped on later runs.
+        Returns None if there is no usable saved tree
+    """
+    try:
+        tree = merkle.load_merkle(tree_file(num_of_primes))
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        print(f"Ignoring saved Merkle tree: {e}")
+        return None
+    if len(tree[0]) != num_of_primes:
+        tree.close()
+        return None
+    return tree
+
+
+def save_tree(tree, num_of_primes):
+    try:
+        merkle.save_merkle(tree, tree_file(num_of_primes))
+    except OSError as e:
+        print(f"Failed to save Merkle tree: {e}")
 
 
 def sign_challenge(challenge):
@@ -186,14 +157,14 @@ def send_signed_msg(proof, random_leaf):
     w3 = connect_to(chain)
 
     # TODO YOUR CODE HERE
-    contract = w3.eth.contract(address=address, abi=abi)
+    contract = get_contract(chain, address, abi)
     nonce = w3.eth.get_transaction_count(acct.address)
-    transaction = contract.functions.submit(proof, random_leaf).build_transaction({
+    # Gas limit, current fees and chain id from the shared fee oracle
+    params = transaction_params(chain, contract, 'submit', (proof, random_leaf), acct.address)
+    transaction = contract.functions.submit(proof, random_leaf).build_transaction(dict(params, **{
         'from': acct.address,
         'nonce': nonce,
-        'gas': 200000,  # Estimate gas limit
-        'gasPrice': w3.to_wei('5', 'gwei'),  # Gas price for BSC testnet
-    })
+    }))
     
     signed_txn = acct.sign_transaction(transaction)
     
@@ -201,7 +172,8 @@ def send_signed_msg(proof, random_leaf):
     
     print(f"Transaction sent! Hash: {tx_hash.hex()}")
     
-    receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+    # Polled together with any other pending transactions, and resumed after a restart
+    receipt = get_receipt_tracker(chain).wait(tx_hash)
     print(f"Transaction confirmed! Block: {receipt.blockNumber}")
 
 
@@ -217,15 +189,8 @@ def connect_to(chain):
     if chain not in ['avax','bsc']:
         print(f"{chain} is not a valid option for 'connect_to()'")
         return None
-    if chain == 'avax':
-        api_url = f"https://api.avax-test.network/ext/bc/C/rpc"  # AVAX C-chain testnet
-    else:
-        api_url = f"https://data-seed-prebsc-1-s1.binance.org:8545/"  # BSC testnet
-    w3 = Web3(Web3.HTTPProvider(api_url))
-    # inject the poa compatibility middleware to the innermost layer
-    w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
-
-    return w3
+    # Shared keep-alive connection with the poa compatibility middleware already injected
+    return get_web3(chain)
 
 
 def get_account():
@@ -249,10 +214,8 @@ def get_contract_info(chain):
     contract_file = Path(__file__).parent.absolute() / "contract_info.json"
     if not contract_file.is_file():
         contract_file = Path(__file__).parent.parent.parent / "tests" / "contract_info.json"
-    with open(contract_file, "r") as f:
-        d = json.load(f)
-        d = d[chain]
-    return d['address'], d['abi']
+    d = load_config(contract_file).chain(chain)
+    return d.address, d.abi
 
 
 def sign_challenge_verify(challenge, addr, sig):
@@ -282,10 +245,9 @@ def hash_pair(a, b):
         Another potential gotcha, if you have a prime number (as an int) bytes(prime) will *not* give you the byte representation of the integer prime
         Instead, you must call int.to_bytes(prime,'big').
     """
-    if a < b:
-        return Web3.solidity_keccak(['bytes32', 'bytes32'], [a, b])
-    else:
-        return Web3.solidity_keccak(['bytes32', 'bytes32'], [b, a])
+    # keccak256 straight over the sorted 64-byte concatenation, which is what
+    # solidity_keccak(['bytes32', 'bytes32'], ...) computes for two bytes32 values
+    return merkle.hash_pair(a, b)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The modules under test live at the top level of the repository
+sys.path.insert(0, str(Path(__file__).parent.parent))
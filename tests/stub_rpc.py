@@ -0,0 +1,134 @@
+"""A local stand-in JSON-RPC node for tests: a chain of fake blocks, logs and canned failures"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from eth_hash.auto import keccak
+
+
+def to_hex(value):
+    return '0x' + value.hex() if isinstance(value, bytes) else hex(value)
+
+
+class StubNode:
+    """
+        Serves eth_chainId, eth_blockNumber, eth_getBlockByNumber/Hash and eth_getLogs
+        over HTTP (single and batch requests) for a chain of head + 1 blocks.
+        Block hashes depend on the node's fork label from fork_from up, so two nodes
+        (or one node before and after reorg()) can disagree about recent blocks.
+        Like a real lagging node, eth_getLogs only returns logs up to the node's own head.
+        Every request is recorded in requests as (method, params)
+    """
+
+    def __init__(self, head, logs=(), chain_id=43113, fail_status=None):
+        self.head = head
+        self.logs = list(logs)
+        self.chain_id = chain_id
+        self.fail_status = fail_status  # answer every request with this HTTP status
+        self.fork = ''
+        self.fork_from = None
+        self.requests = []
+        self._lock = threading.Lock()
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                if node.fail_status is not None:
+                    self.send_response(node.fail_status)
+                    self.end_headers()
+                    return
+                if isinstance(body, list):
+                    reply = [node.answer(request) for request in body]
+                else:
+                    reply = node.answer(body)
+                data = json.dumps(reply).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def methods(self):
+        with self._lock:
+            return [method for method, _ in self.requests]
+
+    def reorg(self, from_block, label):
+        """Replace every block from from_block up with a different fork"""
+        self.fork_from = from_block
+        self.fork = label
+
+    def block_hash(self, number):
+        fork = self.fork if self.fork_from is not None and number >= self.fork_from else ''
+        return keccak(f"{fork}:{number}".encode())
+
+    def block(self, number):
+        if number > self.head:
+            return None
+        return {
+            'number': hex(number),
+            'hash': to_hex(self.block_hash(number)),
+            'parentHash': to_hex(self.block_hash(number - 1)) if number else '0x' + '00' * 32,
+            'timestamp': hex(1700000000 + 2 * number),
+            'transactions': [],
+        }
+
+    def visible_logs(self, from_block, to_block, address=None):
+        if isinstance(address, str):
+            address = [address]
+        addresses = None if address is None else set(a.lower() for a in address)
+        logs = []
+        for log in self.logs:
+            number = log['blockNumber']
+            if from_block <= number <= min(to_block, self.head) and (addresses is None or log['address'].lower() in addresses):
+                # A log belongs to the node's version of its block
+                if log.get('fork', '') != (self.fork if self.fork_from is not None and number >= self.fork_from else ''):
+                    continue
+                logs.append(dict(
+                    {k: v for k, v in log.items() if k != 'fork'},
+                    blockNumber=hex(number),
+                    blockHash=to_hex(self.block_hash(number)),
+                    logIndex=hex(log['logIndex']),
+                    transactionIndex='0x0',
+                    removed=False,
+                ))
+        return logs
+
+    def number(self, tag):
+        if tag in ('latest', 'pending', 'safe', 'finalized'):
+            return self.head
+        if tag == 'earliest':
+            return 0
+        return int(tag, 16)
+
+    def answer(self, request):
+        method, params = request['method'], request.get('params', [])
+        with self._lock:
+            self.requests.append((method, params))
+        if method == 'eth_chainId':
+            result = hex(self.chain_id)
+        elif method == 'eth_blockNumber':
+            result = hex(self.head)
+        elif method == 'eth_getBlockByNumber':
+            result = self.block(self.number(params[0]))
+        elif method == 'eth_getBlockByHash':
+            result = next((self.block(n) for n in range(self.head + 1) if to_hex(self.block_hash(n)) == params[0]), None)
+        elif method == 'eth_getLogs':
+            query = params[0]
+            result = self.visible_logs(self.number(query.get('fromBlock', 'latest')),
+                                       self.number(query.get('toBlock', 'latest')),
+                                       query.get('address'))
+        else:
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'error': {'code': -32601, 'message': f"{method} not supported"}}
+        return {'jsonrpc': '2.0', 'id': request.get('id'), 'result': result}
@@ -0,0 +1,63 @@
+import pytest
+
+import bridge
+from bridge_state import CONFIRMED, FAILED, event_key, get_event_state, mark_event
+
+
+def deposit(i):
+    return {
+        'transactionHash': '0x' + f"{i:064x}",
+        'logIndex': 0,
+        'blockNumber': 100 + i,
+        'blockHash': '0x' + f"{i:064x}",
+        'args': {'token': '0x' + '11' * 20, 'recipient': '0x' + f"{i:040x}", 'amount': i},
+    }
+
+
+class BatchContract:
+    """Stands in for a ChainConfig whose ABI has wrapBatch"""
+    abi = [{'type': 'function', 'name': 'wrapBatch'}, {'type': 'function', 'name': 'wrap'}]
+
+
+@pytest.fixture
+def relays(tmp_path, monkeypatch):
+    sent = []  # (function name, args, tx hash)
+    # Hashes of the transactions that revert
+    reverted = set()
+
+    def send_relay(chain, fn_name, fn_args, contract_info_path):
+        tx_hash = (len(sent) + 1).to_bytes(32, 'big')
+        sent.append((fn_name, fn_args, tx_hash))
+        return tx_hash
+
+    def wait_for_relays(chain, event_chain, event_keys, tx_hash, contract_info_path, state_db):
+        status = 0 if tx_hash in reverted else 1
+        for event_tx, log_index in event_keys:
+            mark_event(event_chain, event_tx, log_index, CONFIRMED if status else FAILED, tx_hash.hex(), state_db)
+        return {'status': status, 'transactionHash': tx_hash}
+
+    monkeypatch.setattr(bridge, 'get_contract_info', lambda chain, path: BatchContract())
+    monkeypatch.setattr(bridge, 'send_relay', send_relay)
+    monkeypatch.setattr(bridge, 'wait_for_relays', wait_for_relays)
+    return sent, reverted, tmp_path / "state.db"
+
+
+def test_events_are_batched(relays):
+    sent, _, state_db = relays
+    events = [deposit(i) for i in range(3)]
+    bridge.relay_events('source', events, 'contract_info.json', state_db)
+
+    assert [fn_name for fn_name, _, _ in sent] == ['wrapBatch']
+    assert all(get_event_state('source', *event_key(e), state_db) == CONFIRMED for e in events)
+
+
+def test_reverted_batch_is_retried_one_event_per_transaction(relays):
+    sent, reverted, state_db = relays
+    # The first transaction, the batch, reverts
+    reverted.add((1).to_bytes(32, 'big'))
+    events = [deposit(i) for i in range(3)]
+    bridge.relay_events('source', events, 'contract_info.json', state_db)
+
+    assert [fn_name for fn_name, _, _ in sent] == ['wrapBatch', 'wrap', 'wrap', 'wrap']
+    assert [args[2] for _, args, _ in sent[1:]] == [0, 1, 2]
+    assert all(get_event_state('source', *event_key(e), state_db) == CONFIRMED for e in events)
@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+from web3 import Web3
+
+import bridge
+from bridge_daemon import BridgeDaemon
+from bridge_state import confirmed_events
+from stub_rpc import StubNode
+from test_bridge_reorg import CONTRACT_INFO, deposit_log
+
+
+@pytest.fixture
+def node(monkeypatch):
+    node = StubNode(head=100, logs=[deposit_log(90)])
+    w3 = Web3(Web3.HTTPProvider(node.url))
+    monkeypatch.setattr(bridge, 'connect_to', lambda chain: w3)
+    monkeypatch.setattr(bridge, 'get_contract', lambda chain, address, abi: w3.eth.contract(address=address, abi=abi))
+    yield node
+    node.close()
+
+
+def test_poller_queues_confirmed_events_and_keeps_polling(node, tmp_path):
+    state_db = tmp_path / "state.db"
+    daemon = BridgeDaemon(CONTRACT_INFO, state_db, poll_intervals={'source': 0.05})
+
+    async def run():
+        await daemon.connect()
+        poller = asyncio.create_task(daemon.poll('source'))
+        # Nobody handles the queue, yet the poller carries on scanning new blocks
+        await asyncio.sleep(0.5)
+        node.head = 105
+        await asyncio.sleep(0.5)
+        poller.cancel()
+        return daemon.queues['source']
+
+    queue = asyncio.run(run())
+    assert queue.qsize() == 1
+    assert bridge.get_cursor('source', state_db) == 105
+    # Still staged until a handler claims it
+    assert [e['blockNumber'] for e in confirmed_events('source', 105, state_db)] == [90]
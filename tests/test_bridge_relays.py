@@ -0,0 +1,91 @@
+from concurrent.futures import Future
+from pathlib import Path
+
+import pytest
+from web3.exceptions import TimeExhausted
+
+import bridge
+from bridge_state import CONFIRMED, SUBMITTED, claim_event, get_event_state, mark_event
+
+EVENT_TX = '0x' + 'ab' * 32
+RELAY_TX = '0x' + 'cd' * 32
+REPLACEMENT_TX = '0x' + 'ef' * 32
+CONTRACT_INFO = str(Path(__file__).parent.parent / "contract_info.json")
+
+
+def to_bytes(tx_hash):
+    return bytes.fromhex(tx_hash[2:])
+
+
+def receipt(tx_hash, status=1):
+    return {'status': status, 'transactionHash': to_bytes(tx_hash)}
+
+
+class FakeTracker:
+    """Stands in for a ReceiptTracker: answers each track() with the next queued outcome"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.tracked = []
+
+    def track(self, tx_hashes, timeout=None):
+        self.tracked.append(list(tx_hashes) if isinstance(tx_hashes, list) else [tx_hashes])
+        future = Future()
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            future.set_exception(outcome)
+        else:
+            future.set_result(outcome)
+        return future
+
+    def resume(self, timeout=None):
+        return []
+
+
+class FakeNonces:
+    def __init__(self):
+        self.confirmed = []
+
+    def nonce_of(self, tx_hash):
+        return 7
+
+    def hashes_of(self, nonce):
+        return [to_bytes(RELAY_TX)]
+
+    def replace(self, nonce, private_key):
+        return to_bytes(REPLACEMENT_TX)
+
+    def confirm(self, nonce):
+        self.confirmed.append(nonce)
+
+
+@pytest.fixture
+def submitted(tmp_path):
+    state_db = tmp_path / "state.db"
+    claim_event('source', EVENT_TX, 0, state_db)
+    mark_event('source', EVENT_TX, 0, SUBMITTED, RELAY_TX, state_db)
+    return state_db
+
+
+def test_relay_sent_without_waiting_is_resumed_from_the_ledger(submitted, monkeypatch):
+    # The run died after sending but before it started waiting, so nothing was tracked
+    trackers = {'destination': FakeTracker(receipt(RELAY_TX)), 'source': FakeTracker()}
+    monkeypatch.setattr(bridge, 'get_receipt_tracker', lambda chain, state_db: trackers[chain])
+
+    futures = bridge.resume_relays(state_db=submitted)
+    assert [f.result()['status'] for f in futures] == [1]
+    assert trackers['destination'].tracked == [[RELAY_TX]]
+    assert get_event_state('source', EVENT_TX, 0, submitted) == CONFIRMED
+
+
+def test_stuck_relay_is_replaced_without_holding_a_thread(submitted, monkeypatch):
+    tracker = FakeTracker(TimeExhausted("stuck"), receipt(REPLACEMENT_TX))
+    nonces = FakeNonces()
+    monkeypatch.setattr(bridge, 'get_receipt_tracker', lambda chain, state_db: tracker)
+    monkeypatch.setattr(bridge, 'get_nonce_manager', lambda chain, w3, address: nonces)
+
+    relay = bridge.RelayWait('destination', 'source', [(EVENT_TX, 0)], to_bytes(RELAY_TX), CONTRACT_INFO, submitted)
+    assert relay.start().result() == receipt(REPLACEMENT_TX)
+    assert tracker.tracked == [[to_bytes(RELAY_TX)], [to_bytes(RELAY_TX), to_bytes(REPLACEMENT_TX)]]
+    assert nonces.confirmed == [7]
+    assert get_event_state('source', EVENT_TX, 0, submitted) == CONFIRMED
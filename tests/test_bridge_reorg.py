@@ -0,0 +1,82 @@
+from pathlib import Path
+
+import pytest
+from web3 import Web3
+
+import bridge
+from bridge_state import get_cursor
+from config import load_config
+from stub_rpc import StubNode
+
+CONTRACT_INFO = str(Path(__file__).parent.parent / "contract_info.json")
+TOKEN = '0x' + '11' * 20
+RECIPIENT = '0x' + '22' * 20
+
+
+def deposit_log(block, fork='', amount=10 ** 18):
+    source = load_config(CONTRACT_INFO).chain('source')
+    return {
+        'address': source.address,
+        'topics': [
+            source.event_topics['Deposit'],
+            '0x' + '00' * 12 + TOKEN[2:],
+            '0x' + '00' * 12 + RECIPIENT[2:],
+        ],
+        'data': '0x' + amount.to_bytes(32, 'big').hex(),
+        'blockNumber': block,
+        'logIndex': 0,
+        'transactionHash': '0x' + f"{block:064x}",
+        'fork': fork,
+    }
+
+
+@pytest.fixture
+def chain(tmp_path, monkeypatch):
+    node = StubNode(head=100)
+    w3 = Web3(Web3.HTTPProvider(node.url))
+    relayed = []
+
+    def relay_events(chain, events, contract_info_path, state_db, wait=True):
+        relayed.extend(events)
+        return []
+
+    monkeypatch.setattr(bridge, 'connect_to', lambda chain: w3)
+    monkeypatch.setattr(bridge, 'get_contract', lambda chain, address, abi: w3.eth.contract(address=address, abi=abi))
+    monkeypatch.setattr(bridge, 'relay_events', relay_events)
+    yield node, relayed, tmp_path / "state.db"
+    node.close()
+
+
+def scan(state_db):
+    assert bridge.scan_blocks('source', CONTRACT_INFO, state_db) == 1
+
+
+def test_reorg_below_the_cursor_without_staged_events_is_rescanned(chain):
+    node, relayed, state_db = chain
+    scan(state_db)
+    assert get_cursor('source', state_db) == 100
+
+    # Between scans, blocks 99 and up are replaced by a fork with a deposit in block 99.
+    # Nothing was staged in the old blocks, so only the recorded block hashes reveal it
+    node.reorg(99, 'b')
+    node.logs.append(deposit_log(99, fork='b'))
+    node.head = 101
+    scan(state_db)
+    assert get_cursor('source', state_db) == 101
+    assert relayed == []  # staged, but not yet CONFIRMATIONS deep
+
+    node.head = 99 + bridge.CONFIRMATIONS['source']
+    scan(state_db)
+    assert [(event['blockNumber'], event['args']['amount']) for event in relayed] == [(99, 10 ** 18)]
+
+
+def test_reorged_out_event_is_never_released(chain):
+    node, relayed, state_db = chain
+    node.logs.append(deposit_log(100))
+    scan(state_db)
+
+    # The block holding the deposit is reorged out before it is confirmed
+    node.reorg(100, 'b')
+    node.head = 110
+    scan(state_db)
+    assert relayed == []
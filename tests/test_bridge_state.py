@@ -0,0 +1,57 @@
+import time
+
+import bridge_state
+from bridge_state import FAILED, SEEN, SUBMITTED, claim_event, failed_events, get_event_state, mark_event
+
+EVENT = {
+    'transactionHash': '0x' + 'ab' * 32,
+    'logIndex': 3,
+    'blockNumber': 100,
+    'blockHash': '0x' + 'cd' * 32,
+    'args': {'token': '0x' + '11' * 20, 'recipient': '0x' + '22' * 20, 'amount': 10 ** 30},
+}
+TX, INDEX = EVENT['transactionHash'], EVENT['logIndex']
+
+
+def test_claim_is_exclusive(tmp_path):
+    db = tmp_path / "state.db"
+    assert claim_event('source', TX, INDEX, db, EVENT)
+    # A second run must not pick up an event another run is relaying
+    assert not claim_event('source', TX, INDEX, db, EVENT)
+    assert get_event_state('source', TX, INDEX, db) == SEEN
+
+    mark_event('source', TX, INDEX, SUBMITTED, '0x' + 'ee' * 32, db)
+    assert not claim_event('source', TX, INDEX, db, EVENT)
+
+
+def test_abandoned_claim_is_reclaimed(tmp_path, monkeypatch):
+    db = tmp_path / "state.db"
+    assert claim_event('source', TX, INDEX, db, EVENT)
+    later = time.time() + bridge_state.CLAIM_TIMEOUT + 1
+    monkeypatch.setattr(bridge_state.time, 'time', lambda: later)
+    assert claim_event('source', TX, INDEX, db, EVENT)
+
+
+def test_failed_events_are_retried_until_attempts_run_out(tmp_path):
+    db = tmp_path / "state.db"
+    for _ in range(bridge_state.MAX_RELAY_ATTEMPTS):
+        assert claim_event('source', TX, INDEX, db, EVENT)
+        mark_event('source', TX, INDEX, FAILED, db_path=db)
+        retries = failed_events('source', db, retry_delay=0)
+        if retries:
+            assert retries == [EVENT]
+
+    assert failed_events('source', db, retry_delay=0) == []
+    assert not claim_event('source', TX, INDEX, db, EVENT)
+
+
+def test_abandoned_claim_is_released_again(tmp_path, monkeypatch):
+    db = tmp_path / "state.db"
+    # A run claims the event and dies before sending; other runs skip (and unstage) it
+    assert claim_event('source', TX, INDEX, db, EVENT)
+    assert failed_events('source', db, retry_delay=0) == []
+
+    later = time.time() + bridge_state.CLAIM_TIMEOUT + 1
+    monkeypatch.setattr(bridge_state.time, 'time', lambda: later)
+    assert failed_events('source', db) == [EVENT]
+    assert claim_event('source', TX, INDEX, db, EVENT)
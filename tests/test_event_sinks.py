@@ -0,0 +1,24 @@
+import pytest
+
+from event_sinks import open_sink
+
+ROW = {
+    'chain': 'avax', 'token': '0x' + '11' * 20, 'recipient': '0x' + '22' * 20, 'amount': 10 ** 30,
+    'transactionHash': 'ab' * 32, 'address': '0x' + '33' * 20, 'date': '01/01/2026 00:00:00',
+    'blockNumber': 100, 'logIndex': 0, 'timestamp': 1767225600,
+}
+
+
+def test_failed_parquet_run_leaves_no_part(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    path = tmp_path / "deposits.parquet"
+    with open_sink(path) as sink:
+        sink.write(ROW)
+
+    with pytest.raises(RuntimeError):
+        with open_sink(path, batch_size=1) as sink:
+            sink.write(ROW)
+            raise RuntimeError("scan failed")
+
+    assert len(list(path.iterdir())) == 1
+    assert pq.read_table(str(path)).num_rows == 1
@@ -0,0 +1,38 @@
+import requests
+
+from logscan import LogScanner, is_throttle_error
+
+
+class FlakyEvent:
+    """Stands in for a contract event whose node fails requests with the queued errors"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.ranges = []
+
+    def get_logs(self, from_block, to_block, argument_filters=None):
+        self.ranges.append((from_block, to_block))
+        if self.errors:
+            raise self.errors.pop(0)
+        return []
+
+
+def test_block_numbers_are_not_throttling():
+    assert not is_throttle_error(ValueError("header not found for block 0x429a: 14290"))
+    assert is_throttle_error(ValueError({'code': -32005, 'message': 'Too many requests, slow down'}))
+
+
+def test_query_timeout_shrinks_the_window():
+    event = FlakyEvent(ValueError({'code': -32000, 'message': 'query timeout exceeded'}))
+    scanner = LogScanner(event, window=1000, backoff=0)
+    list(scanner.iter_logs(0, 999))
+    assert event.ranges == [(0, 999), (0, 499), (500, 999)]
+
+
+def test_throttling_is_retried_at_the_same_window():
+    response = requests.Response()
+    response.status_code = 429
+    event = FlakyEvent(requests.HTTPError("429 Client Error", response=response))
+    scanner = LogScanner(event, window=1000, backoff=0)
+    list(scanner.iter_logs(0, 999))
+    assert event.ranges == [(0, 999), (0, 999)]
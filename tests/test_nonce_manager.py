@@ -0,0 +1,57 @@
+import pytest
+from web3.exceptions import TransactionNotFound
+
+from nonce_manager import NonceManager
+
+ADDRESS = '0x' + '77' * 20
+
+
+class FakeEth:
+    """Stands in for w3.eth: transaction counts and the transactions the node knows"""
+
+    def __init__(self, mined, pending=None):
+        self.mined = mined
+        self.pending = mined if pending is None else pending
+        self.known = set()
+
+    def get_transaction_count(self, address, block):
+        return self.mined if block == 'latest' else self.pending
+
+    def get_transaction(self, tx_hash):
+        if tx_hash not in self.known:
+            raise TransactionNotFound(f"{tx_hash} not found")
+        return {'hash': tx_hash}
+
+
+class FakeWeb3:
+    def __init__(self, mined, pending=None):
+        self.eth = FakeEth(mined, pending)
+
+
+@pytest.fixture
+def manager():
+    w3 = FakeWeb3(mined=10)
+    return w3.eth, NonceManager(w3, ADDRESS)
+
+
+def test_reconcile_skips_nonces_being_sent(manager):
+    eth, nonces = manager
+    first = nonces.allocate()
+    # Another thread resyncs while the first send is still being built
+    nonces.reconcile()
+    second = nonces.allocate()
+    assert (first, second) == (10, 11)
+
+    nonces.record(first, {}, b'\x01' * 32)
+    nonces.record(second, {}, b'\x02' * 32)
+    nonces.reconcile()
+    assert nonces.allocate() == 12
+
+
+def test_only_a_known_transaction_counts_as_broadcast(manager):
+    eth, nonces = manager
+    # After "nonce too low" the pending count is past the nonce, but that was someone else
+    eth.mined = eth.pending = 11
+    assert not nonces.was_broadcast(b'\x01' * 32)
+    eth.known.add(b'\x01' * 32)
+    assert nonces.was_broadcast(b'\x01' * 32)
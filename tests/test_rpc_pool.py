@@ -0,0 +1,140 @@
+import threading
+
+import pytest
+import requests
+from web3 import Web3
+
+from connections import pinned
+from rpc_pool import PooledProvider
+from stub_rpc import StubNode
+
+CONTRACT = '0x' + '42' * 20
+LOG = {
+    'address': CONTRACT,
+    'topics': ['0x' + '01' * 32],
+    'data': '0x',
+    'blockNumber': 150,
+    'logIndex': 0,
+    'transactionHash': '0x' + 'aa' * 32,
+}
+
+
+@pytest.fixture
+def nodes():
+    # Both nodes hold the same chain, but one lags 80 blocks behind
+    fast = StubNode(head=200, logs=[LOG])
+    lagging = StubNode(head=120, logs=[LOG])
+    yield fast, lagging
+    fast.close()
+    lagging.close()
+
+
+def pooled(*nodes, **kwargs):
+    provider = PooledProvider([node.url for node in nodes], hedge_after=5, backoff=0, **kwargs)
+    return provider, Web3(provider)
+
+
+def prefer(provider, index):
+    """Make endpoint index rank first"""
+    for i, endpoint in enumerate(provider.endpoints):
+        endpoint.latency = 0.01 if i == index else 1.0
+
+
+def test_unpinned_reads_can_mix_nodes(nodes):
+    fast, lagging = nodes
+    provider, w3 = pooled(fast, lagging)
+    prefer(provider, 0)
+    head = w3.eth.block_number
+    prefer(provider, 1)
+    # The lagging node has nothing above its own head: this is how events got lost
+    assert w3.eth.get_logs({'fromBlock': 100, 'toBlock': head, 'address': CONTRACT}) == []
+
+
+def test_pinned_reads_stay_on_one_node(nodes):
+    fast, lagging = nodes
+    provider, w3 = pooled(fast, lagging)
+    prefer(provider, 0)
+    with pinned(w3):
+        head = w3.eth.block_number
+        prefer(provider, 1)
+        logs = w3.eth.get_logs({'fromBlock': 100, 'toBlock': head, 'address': CONTRACT})
+
+    assert head == 200
+    assert [log['blockNumber'] for log in logs] == [150]
+    assert lagging.methods() == []
+
+    # Once unpinned, requests are balanced again
+    w3.eth.block_number
+    assert lagging.methods() == ['eth_blockNumber']
+
+
+def test_pinned_reads_agree_on_a_lagging_node(nodes):
+    fast, lagging = nodes
+    provider, w3 = pooled(fast, lagging)
+    prefer(provider, 1)
+    with pinned(w3):
+        head = w3.eth.block_number
+        prefer(provider, 0)
+        logs = w3.eth.get_logs({'fromBlock': 100, 'toBlock': head, 'address': CONTRACT})
+
+    # The scan stops at the lagging node's head, so the event is found by the next one
+    assert head == 120 and logs == []
+    assert fast.methods() == []
+
+
+def test_pinned_endpoint_failure_is_raised_not_failed_over(nodes):
+    fast, lagging = nodes
+    fast.fail_status = 500
+    provider, w3 = pooled(fast, lagging, max_retries=1)
+    prefer(provider, 0)
+    with pinned(w3):
+        with pytest.raises(requests.HTTPError):
+            w3.eth.block_number
+    assert lagging.methods() == []
+
+
+def test_unpinned_requests_fail_over(nodes):
+    fast, lagging = nodes
+    fast.fail_status = 429
+    provider, w3 = pooled(fast, lagging, max_retries=1)
+    prefer(provider, 0)
+    assert w3.eth.block_number == 120
+    assert lagging.methods() == ['eth_blockNumber']
+
+
+def test_pin_only_applies_to_the_pinning_thread(nodes):
+    fast, lagging = nodes
+    fast.fail_status = 429
+    provider, w3 = pooled(fast, lagging, max_retries=1)
+    prefer(provider, 0)
+    result = {}
+
+    def other_thread():
+        result['head'] = w3.eth.block_number
+
+    with pinned(w3) as endpoint:
+        # Another thread (say the receipt tracker) still fails over
+        thread = threading.Thread(target=other_thread)
+        thread.start()
+        thread.join()
+        assert endpoint.url == fast.url
+    assert result['head'] == 120
+
+
+def test_worker_threads_join_a_pin(nodes):
+    fast, lagging = nodes
+    provider, w3 = pooled(fast, lagging)
+    prefer(provider, 0)
+    result = {}
+
+    def worker(endpoint):
+        with pinned(w3, endpoint):
+            prefer(provider, 1)
+            result['head'] = w3.eth.block_number
+
+    with pinned(w3) as endpoint:
+        thread = threading.Thread(target=worker, args=(endpoint,))
+        thread.start()
+        thread.join()
+    assert result['head'] == 200
+    assert lagging.methods() == []